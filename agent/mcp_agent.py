@@ -1,9 +1,10 @@
 import asyncio
-import json
-import requests
 from mcp.client.stdio import stdio_client, StdioServerParameters
 from mcp.client.session import ClientSession
-import time
+from helpers import codec
+from helpers.llm_client import AsyncLLMClient
+from helpers.plan_cache import PlanCache
+from helpers.validaters import validate_plan
 
 # ----------------- Database server parameters -----------------
 DB_PARAMS = StdioServerParameters(
@@ -16,43 +17,66 @@ FILE_PARAMS = StdioServerParameters(
     command="python3",
     args=["servers/file_server.py"])  # adjust path as needed
 
+# ----------------- Plan validation -----------------
+def as_contract_step(step: dict) -> dict:
+    """
+    This agent's resource actions carry the URI at top level and no tool
+    ({"type": "resource", "server": "file", "uri": ...}); check them as
+    the read_file call they stand for.
+    """
+    if isinstance(step, dict) and step.get("type") == "resource" and "tool" not in step:
+        return {**step, "tool": "read_file", "arguments": {"uri": step.get("uri")}}
+    return step
+
+
+def validate_agent_plan(plan: list) -> bool:
+    """
+    validate_plan for plans in this agent's action schema.
+    """
+    if not isinstance(plan, list):
+        raise ValueError("Plan must be a list")
+    return validate_plan([as_contract_step(step) for step in plan])
+
+
 # ----------------- LLaMA HTTP API call -----------------
 #def ask_llama(prompt: str) -> dict:
-def ask_llama(prompt: str, max_retries: int = 3) -> dict:   
-    last_error = None
+async def ask_llama(prompt: str, max_retries: int = 3, cache: PlanCache = None,
+                    llm: AsyncLLMClient = None) -> dict:
     """Call local LLaMA model via Ollama HTTP API and parse JSON output."""
+    if llm is None:
+        async with AsyncLLMClient(timeout=1200) as llm:
+            return await _ask_llama(prompt, max_retries, cache, llm)
+    return await _ask_llama(prompt, max_retries, cache, llm)
+
+
+async def _ask_llama(prompt: str, max_retries: int, cache: PlanCache,
+                     llm: AsyncLLMClient) -> dict:
+    last_error = None
+    options = {"num_predict": 512}
+    if cache is not None:
+        # Keyed on the model and options the request is actually sent with
+        cache_key = cache.make_key(prompt, llm.request_options(options))
+        cached = cache.get(cache_key)
+        if cached is not None:
+            print(f"LLM plan cache hit {cache.stats()}")
+            return cached
     print("Calling LLM with prompt:\n")
     print(prompt)
     for attempt in range(1, max_retries + 1):
       try:
-         response = requests.post(
-            "http://localhost:11434/api/generate",
-              json={
-                     "model": "llama3",  # your local model
-                     "prompt": prompt,
-                     "stream": False,    # simplified for MCP
-                     "options": {
-                                  "temperature": 0.0,
-                                  "num_predict": 512
-                                }
-                   },
-              timeout=1200,
-         )
-         response.raise_for_status()
-         response_text = response.json()["response"].strip()
+         # HTTP errors are retried with backoff inside the shared client
+         response_text = (await llm.generate(prompt, options)).strip()
          print(f"LLM Plan:\n {response_text}")
          
-         
-         return json.loads(response.json()["response"]) 
-      except (requests.exceptions.Timeout,
-                requests.exceptions.ConnectionError) as e:
-            last_error = f"HTTP error: {e}"
-
-      except json.JSONDecodeError as e:
+         plan = codec.loads(response_text)
+         if cache is not None:
+             cache.put(cache_key, plan, validate_agent_plan)
+         return plan
+      except codec.JSONDecodeError as e:
             last_error = f"Invalid JSON: {e}"
 
       print(f"LLM call failed (attempt {attempt}): {last_error}")
-      time.sleep(2 * attempt)  # backoff      
+      await asyncio.sleep(llm.backoff(attempt))  # backoff      
     
     raise RuntimeError(f"LLM failed after {max_retries} attempts: {last_error}")  
 
@@ -138,7 +162,7 @@ then list all users, write the list to 'user_list.json', then read it back.
 #User request: Create a user named "Smith" with email "smith@example.com", then list all users, write the list to 'user_list.json', then read it back.
             
             # Ask Ollama to plan tool calls
-            plan = ask_llama(prompt)
+            plan = await ask_llama(prompt, cache=PlanCache())
             # Execute each tool call via MCP
             list_users_result = None
             for step in plan:
@@ -150,16 +174,16 @@ then list all users, write the list to 'user_list.json', then read it back.
                                       arguments=step["arguments"])
                            if step["tool"] == "list_users":
                                #list_users_result = [json.loads(c.text) for c in result.content]
-                               list_users_result = json.loads(result.content[0].text)
+                               list_users_result = codec.loads(result.content[0].text)
             # ---------------- File tools ----------------
                        elif step["server"] == "file":
                            # Inject list_users output if needed
                            if step["tool"] == "write_file" and step["arguments"]["path"] == "user_list.json":
-                               step["arguments"]["content"] = json.dumps(list_users_result or [])
+                               step["arguments"]["content"] = codec.dumps(list_users_result or [])
                            result = await file_session.call_tool(step["tool"], arguments=step["arguments"])
                        # Print results
-                       formatted = [json.loads(c.text) for c in result.content] if step["type"] == "tool" else result  
-                       print(f"Result for {step.get('tool') or step.get('uri')}:\n", json.dumps(formatted, indent=2))
+                       formatted = [codec.loads(c.text) for c in result.content] if step["type"] == "tool" else result  
+                       print(f"Result for {step.get('tool') or step.get('uri')}:\n", codec.dumps(formatted, indent=True))
             # ---------------- Resource reads ----------------
                     elif step["type"] == "resource":           
                        content = await file_session.read_resource(step["uri"])
@@ -0,0 +1,97 @@
+from collections import defaultdict
+from typing import Dict, List
+
+from helpers.contracts import TOOL_CONTRACTS
+
+# =========================
+# Batchable tools
+# =========================
+
+# single-step tool -> (batch tool, batch argument holding the per-step arguments)
+BATCH_TOOLS = {
+    "create_user": ("create_users", "users"),
+}
+
+
+def _has_from(value) -> bool:
+    if isinstance(value, dict):
+        return "$from" in value or any(_has_from(v) for v in value.values())
+    if isinstance(value, list):
+        return any(_has_from(v) for v in value)
+    return False
+
+
+def is_batchable(step: dict) -> bool:
+    """
+    A step can join a batch when its tool has a batch variant, its contract
+    is commutative, and it neither depends on nor receives data from another
+    step (batched steps must be free to run in any order).
+    """
+    tool = step.get("tool")
+    contract = TOOL_CONTRACTS.get(tool)
+    if tool not in BATCH_TOOLS or not contract or not contract.commutative:
+        return False
+    if step.get("type", "tool") != "tool" or step.get("$from"):
+        return False
+    return not _has_from(step.get("arguments", {}))
+
+
+def merge_sibling_batches(plan: List[dict], layers: List[List[int]]) -> List[dict]:
+    """
+    Planner pass: merge batchable sibling steps of the same DAG layer into a
+    single batch call.
+
+    The batch step takes the place of the first member in the plan and lists
+    the merged step ids under "members" so results can be split back out per
+    step id (see split_batch_output). Plans without step ids are returned as is.
+    """
+    if not all("id" in step for step in plan):
+        return plan
+
+    batches = {}
+    absorbed = set()
+
+    for layer in layers:
+        groups = defaultdict(list)
+        for node in layer:
+            step = plan[node]
+            if is_batchable(step):
+                groups[(step.get("server"), step["tool"])].append(node)
+
+        for (server, tool), nodes in groups.items():
+            if len(nodes) < 2:
+                continue
+            nodes.sort()
+            batch_tool, batch_arg = BATCH_TOOLS[tool]
+            batches[nodes[0]] = {
+                "id": f"batch_{plan[nodes[0]]['id']}",
+                "type": "tool",
+                "server": server,
+                "tool": batch_tool,
+                "arguments": {batch_arg: [plan[n]["arguments"] for n in nodes]},
+                "$from": [],
+                "members": [plan[n]["id"] for n in nodes],
+            }
+            absorbed.update(nodes[1:])
+
+    merged_plan = []
+    for i, step in enumerate(plan):
+        if i in batches:
+            merged_plan.append(batches[i])
+        elif i not in absorbed:
+            merged_plan.append(step)
+    return merged_plan
+
+
+def split_batch_output(step: dict, output: list) -> Dict[str, object]:
+    """
+    Split a batch step's decoded output (one result per member, in order)
+    into per-member outputs shaped like the single-step tool's result.
+    """
+    members = step["members"]
+    if len(output) != len(members):
+        raise RuntimeError(
+            f"Batch step '{step['id']}' returned {len(output)} results "
+            f"for {len(members)} members"
+        )
+    return dict(zip(members, output))
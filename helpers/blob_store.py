@@ -0,0 +1,208 @@
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+
+from helpers import codec
+
+# =========================
+# Content-addressed blob store
+# =========================
+
+DEFAULT_BLOB_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".blobs"
+)
+BLOB_SCHEME = "blob://"
+HANDLE_RE = re.compile(r"^blob://([0-9a-f]{64})$")
+
+# Inlined arguments above this size are stored and passed as a handle
+DEFAULT_INLINE_LIMIT = 64 * 1024
+
+# tool -> argument that accepts a blob handle instead of the value itself
+BLOB_ARGS = {
+    "write_file": "content",
+}
+
+
+def encode_json(value) -> bytes:
+    """
+    JSON bytes of a value stored as a blob: write_file's own format for
+    non-text content (two-space indent), so a blob copied into a file gives
+    the same bytes as the value written inline.
+    """
+    return codec.dumpb(value, indent=True)
+
+
+def is_handle(value) -> bool:
+    return isinstance(value, str) and HANDLE_RE.match(value) is not None
+
+
+def is_blob_ref(value) -> bool:
+    """
+    A tool result pointing at a blob: {"blob": "blob://<sha256>", ...}.
+    Its bytes are encode_json() of the value, unless "raw" is set (a file's
+    bytes as read).
+    """
+    return isinstance(value, dict) and is_handle(value.get("blob"))
+
+
+class BlobStore:
+    """
+    Directory of immutable files named by the SHA-256 of their content,
+    shared by the client and both servers (all run from this repository).
+
+    Large step outputs are written once and passed between steps as
+    "blob://<sha256>" handles instead of travelling over stdio on every hop.
+    Reads are memory-mapped. Identical payloads are stored once.
+    """
+
+    def __init__(self, root: str = DEFAULT_BLOB_DIR):
+        self.root = root
+
+    def path(self, handle: str) -> str:
+        match = HANDLE_RE.match(handle)
+        if match is None:
+            raise ValueError(f"Not a blob handle: {handle!r}")
+        digest = match.group(1)
+        return os.path.join(self.root, digest[:2], digest)
+
+    # ---------- writes ----------
+
+    def put(self, data: bytes) -> str:
+        handle = BLOB_SCHEME + hashlib.sha256(data).hexdigest()
+        path = self.path(handle)
+        if os.path.exists(path):
+            return handle
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write aside and rename: readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return handle
+
+    def put_json(self, value) -> str:
+        return self.put(encode_json(value))
+
+    def writer(self) -> "BlobWriter":
+        return BlobWriter(self)
+
+    # ---------- reads ----------
+
+    def exists(self, handle: str) -> bool:
+        return os.path.exists(self.path(handle))
+
+    @contextmanager
+    def open(self, handle: str):
+        """
+        Read-only memory map of a blob (b"" for an empty one).
+        """
+        path = self.path(handle)
+        if not os.path.exists(path):
+            raise ValueError(f"Unknown blob {handle}")
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b""
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+
+    def get(self, handle: str) -> bytes:
+        with self.open(handle) as data:
+            return data[:]
+
+    def get_json(self, handle: str):
+        # Decoded straight from the mapping where the backend allows it
+        with self.open(handle) as data, memoryview(data) as view:
+            return codec.loads(view)
+
+    def copy_to(self, handle: str, path: str):
+        """
+        Write a blob's bytes to `path` without decoding them.
+        """
+        with self.open(handle) as data, open(path, "wb") as out:
+            out.write(data)
+
+    def size(self, handle: str) -> int:
+        return os.path.getsize(self.path(handle))
+
+
+class BlobWriter:
+    """
+    put() for data arriving in pieces: each write() is hashed and appended
+    to a temporary file, close() moves it into place and returns the handle.
+    Only the piece being written is held in memory.
+    """
+
+    def __init__(self, store: BlobStore):
+        self.store = store
+        self.size = 0
+        self._hash = hashlib.sha256()
+        os.makedirs(store.root, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=store.root)
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes):
+        self._hash.update(data)
+        self._file.write(data)
+        self.size += len(data)
+
+    def close(self) -> str:
+        self._file.close()
+        handle = BLOB_SCHEME + self._hash.hexdigest()
+        path = self.store.path(handle)
+        if os.path.exists(path):
+            os.unlink(self._tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._tmp_path, path)
+        return handle
+
+    def abort(self):
+        self._file.close()
+        os.unlink(self._tmp_path)
+
+
+def materialize(value, store: BlobStore):
+    """
+    Replace blob refs anywhere in `value` by the data they point at.
+    """
+    if is_blob_ref(value):
+        return store.get_json(value["blob"])
+    if isinstance(value, dict):
+        return {k: materialize(v, store) for k, v in value.items()}
+    if isinstance(value, list):
+        return [materialize(v, store) for v in value]
+    return value
+
+
+def pass_by_handle(tool: str, args: dict, store: BlobStore,
+                   inline_limit: int = DEFAULT_INLINE_LIMIT) -> dict:
+    """
+    Arguments for a tool call with blobs resolved the cheapest way: the
+    argument a tool accepts handles for (BLOB_ARGS) gets a handle when its
+    value is an encoded JSON blob ref or larger than `inline_limit`
+    serialized; every other blob ref is read back locally, since the tool
+    can't (or, for a raw file, would copy it unformatted).
+    """
+    blob_arg = BLOB_ARGS.get(tool)
+    resolved = {}
+    for name, value in args.items():
+        if name != blob_arg:
+            resolved[name] = materialize(value, store)
+        elif is_blob_ref(value) and not value.get("raw"):
+            resolved[name] = value["blob"]
+        elif isinstance(value, str):
+            resolved[name] = store.put(value.encode("utf-8")) if len(value) > inline_limit else value
+        else:
+            value = materialize(value, store)
+            data = encode_json(value)
+            resolved[name] = store.put(data) if len(data) > inline_limit else value
+    return resolved
@@ -0,0 +1,150 @@
+import json
+import os
+from typing import Callable, Dict, List, Optional
+
+# =========================
+# JSON codec
+# =========================
+#
+# Every JSON encode/decode on the agent's hot paths goes through loads() and
+# dumps()/dumpb(). The fastest installed backend is used: orjson, then
+# msgspec, then the standard library. Set MCP_AGENT_JSON_CODEC to a backend
+# name (the servers read it too) or call use() to pick one explicitly.
+#
+# Backends may differ in whitespace and in escaping non-ASCII text; the
+# decoded values are the same.
+
+JSONDecodeError = json.JSONDecodeError
+PREFERENCE = ("orjson", "msgspec", "json")
+CODEC_ENV = "MCP_AGENT_JSON_CODEC"
+
+
+def _stdlib_backend():
+    def loads(data):
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+    def dumpb(value, indent=False, sort_keys=False, default=None) -> bytes:
+        return json.dumps(
+            value, indent=2 if indent else None, sort_keys=sort_keys, default=default
+        ).encode("utf-8")
+
+    return loads, dumpb
+
+
+def _orjson_backend():
+    import orjson
+
+    def dumpb(value, indent=False, sort_keys=False, default=None) -> bytes:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(value, default=default, option=option)
+
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError
+    return orjson.loads, dumpb
+
+
+def _msgspec_backend():
+    import msgspec
+
+    decoder = msgspec.json.Decoder()
+    encoders = {
+        False: msgspec.json.Encoder(),
+        True: msgspec.json.Encoder(order="sorted"),
+    }
+
+    def loads(data):
+        try:
+            return decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise JSONDecodeError(str(e), "", 0) from e
+
+    def dumpb(value, indent=False, sort_keys=False, default=None) -> bytes:
+        if default is None:
+            encoder = encoders[bool(sort_keys)]
+        else:
+            encoder = msgspec.json.Encoder(
+                enc_hook=default, order="sorted" if sort_keys else None
+            )
+        data = encoder.encode(value)
+        return msgspec.json.format(data, indent=2) if indent else data
+
+    return loads, dumpb
+
+
+_FACTORIES: Dict[str, Callable] = {
+    "orjson": _orjson_backend,
+    "msgspec": _msgspec_backend,
+    "json": _stdlib_backend,
+}
+
+backend: str = ""
+_loads: Callable = None
+_dumpb: Callable = None
+
+
+def available() -> List[str]:
+    """
+    Installed backends, fastest first.
+    """
+    names = []
+    for name in PREFERENCE:
+        try:
+            _FACTORIES[name]()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def use(name: Optional[str] = None) -> str:
+    """
+    Switch to backend `name`, or to the fastest installed one. Returns its name.
+    """
+    global backend, _loads, _dumpb
+    if name is not None and name not in _FACTORIES:
+        raise ValueError(f"Unknown JSON codec '{name}', expected one of {PREFERENCE}")
+
+    for candidate in ([name] if name else PREFERENCE):
+        try:
+            _loads, _dumpb = _FACTORIES[candidate]()
+        except ImportError:
+            if name:
+                raise
+            continue
+        backend = candidate
+        return backend
+
+
+def loads(data):
+    """
+    Decode str, bytes, bytearray or memoryview.
+    """
+    return _loads(data)
+
+
+def dumpb(value, indent=False, sort_keys=False, default=None) -> bytes:
+    """
+    Encode to UTF-8 bytes; indent=True means two spaces.
+    """
+    return _dumpb(value, indent, sort_keys, default)
+
+
+def dumps(value, indent=False, sort_keys=False, default=None) -> str:
+    return _dumpb(value, indent, sort_keys, default).decode("utf-8")
+
+
+def canonical(value) -> bytes:
+    """
+    Sorted-key encoding that is the same whichever backend is in use, for
+    hashing (cache keys). Always the standard library's json.dumps(sort_keys=True)
+    output, so keys don't change when the backend does.
+    """
+    return json.dumps(value, sort_keys=True).encode("utf-8")
+
+
+use(os.environ.get(CODEC_ENV) or None)
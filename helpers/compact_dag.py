@@ -0,0 +1,108 @@
+from array import array
+
+# =========================
+# Compact execution DAG
+# =========================
+
+
+class CompactDAG:
+    """
+    Immutable, array-backed DAG over plan indices 0..n-1.
+
+    Successors are stored in CSR form (one offsets array, one targets array)
+    and in-degrees as an int array. Edges must point forward in plan order,
+    which every builder guarantees and which makes the graph acyclic by
+    construction. Exposes the small part of the nx.DiGraph API the layer
+    builders and executors use; to_networkx() is for debugging only.
+    """
+
+    __slots__ = ("steps", "_offsets", "_targets", "_in_degree")
+
+    def __init__(self, steps, edges=()):
+        n = len(steps)
+        pairs = sorted(set(edges))
+
+        offsets = array("l", [0]) * (n + 1)
+        in_degree = array("l", [0]) * n
+        for src, dst in pairs:
+            if not 0 <= src < dst < n:
+                raise ValueError(f"Edge {src} -> {dst} does not follow plan order")
+            offsets[src + 1] += 1
+            in_degree[dst] += 1
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+
+        self.steps = list(steps)
+        self._offsets = offsets
+        self._targets = array("l", (dst for _, dst in pairs))
+        self._in_degree = in_degree
+
+    def __len__(self):
+        return len(self.steps)
+
+    @property
+    def nodes(self):
+        return range(len(self.steps))
+
+    @property
+    def edges(self):
+        return [
+            (src, dst)
+            for src in self.nodes
+            for dst in self.successors(src)
+        ]
+
+    def number_of_edges(self) -> int:
+        return len(self._targets)
+
+    def successors(self, node):
+        return self._targets[self._offsets[node]:self._offsets[node + 1]]
+
+    def in_degree(self, node) -> int:
+        return self._in_degree[node]
+
+    def in_degrees(self):
+        """
+        Mutable copy of the in-degree array, for Kahn-style schedulers.
+        """
+        return array("l", self._in_degree)
+
+    def copy(self):
+        # Immutable: a copy can share the arrays
+        clone = CompactDAG.__new__(CompactDAG)
+        clone.steps = list(self.steps)
+        clone._offsets = self._offsets
+        clone._targets = self._targets
+        clone._in_degree = self._in_degree
+        return clone
+
+    def transitive_reduction(self):
+        """
+        Return a new DAG without edges implied by longer paths.
+        Descendant sets are int bitsets, built from the last node backwards.
+        """
+        descendants = [0] * len(self.steps)
+        kept = []
+        for src in reversed(self.nodes):
+            covered = 0
+            reach = 0
+            # Only an earlier successor can reach a later one
+            for dst in self.successors(src):
+                if not covered >> dst & 1:
+                    kept.append((src, dst))
+                covered |= descendants[dst]
+                reach |= descendants[dst] | (1 << dst)
+            descendants[src] = reach
+        return CompactDAG(self.steps, kept)
+
+    def to_networkx(self):
+        """
+        Debug export; networkx is only imported here.
+        """
+        import networkx as nx
+
+        G = nx.DiGraph()
+        for i, step in enumerate(self.steps):
+            G.add_node(i, step=step)
+        G.add_edges_from(self.edges)
+        return G
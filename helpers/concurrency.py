@@ -0,0 +1,68 @@
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+# =========================
+# Per-server in-flight caps
+# =========================
+
+# Default number of MCP requests allowed in flight per server process
+DEFAULT_MAX_IN_FLIGHT = 8
+
+MAX_IN_FLIGHT = {
+    "db": 8,
+    "file": 8,
+}
+
+
+class ServerLimiter:
+    """
+    Caps the number of concurrent MCP requests sent to each server.
+
+    A ClientSession correlates every response with its JSON-RPC request id,
+    so many call_tool/read_resource requests can share one session at the
+    same time. The only thing left to bound is how hard we push a single
+    server process, which is what the per-server semaphores do.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None,
+                 default_limit: int = DEFAULT_MAX_IN_FLIGHT):
+        self.limits = dict(MAX_IN_FLIGHT)
+        if limits:
+            self.limits.update(limits)
+        self.default_limit = default_limit
+
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Dict[str, int] = defaultdict(int)
+
+    def limit_for(self, server: str) -> int:
+        return self.limits.get(server, self.default_limit)
+
+    def in_flight(self, server: str) -> int:
+        return self._in_flight[server]
+
+    def available(self, server: str) -> int:
+        """
+        Number of free request slots for a server right now.
+        """
+        return max(self.limit_for(server) - self._in_flight[server], 0)
+
+    def _semaphore(self, server: str) -> asyncio.Semaphore:
+        sem = self._semaphores.get(server)
+        if sem is None:
+            sem = asyncio.Semaphore(self.limit_for(server))
+            self._semaphores[server] = sem
+        return sem
+
+    @asynccontextmanager
+    async def slot(self, server: str):
+        """
+        Hold one in-flight slot on `server` for the duration of a request.
+        """
+        async with self._semaphore(server):
+            self._in_flight[server] += 1
+            try:
+                yield
+            finally:
+                self._in_flight[server] -= 1
@@ -1,3 +1,4 @@
+import re
 from dataclasses import dataclass
 from typing import Dict, Set, Type, Callable, Optional
 from collections import namedtuple
@@ -22,9 +23,16 @@ class ToolContract:
     optional_args: Dict[str, Type] = None
 
     # Dynamic state resolver
-    # Allows reads/writes to be computed from arguments at runtime
+    # Allows reads/writes to be computed from arguments at runtime.
+    # It may also return "bumps": keys written commutatively whatever the
+    # tool's own commutativity (row writes bump their table key).
     state_resolver: Optional[Callable[[Dict], Dict[str, Set[str]]]] = None
 
+    # Cost model priors; helpers.tool_stats replaces them with observed values
+    expected_latency_ms: float = 50.0
+    payload_bytes: int = 1024        # typical size of the tool's result
+    resource_class: str = "db.read"
+
 
 # =========================
 # Canonical State Vocabulary
@@ -32,9 +40,20 @@ class ToolContract:
 
 DB_USERS = "db.users"
 
+# Row-level keys: "db.users:id=N" per row, plus the set of rows itself.
+# Inserts (and writes whose rows are unknown) change the set of rows, so
+# every row-level operation reads DB_USERS_INSERTS.
+DB_USERS_INSERTS = f"{DB_USERS}:inserts"
+
 # File-level granularity (NOT directories)
 FS_FILE_PREFIX = "fs.file:"
 
+# Resource classes: what a tool mostly spends its time on
+RESOURCE_DB_READ = "db.read"
+RESOURCE_DB_WRITE = "db.write"
+RESOURCE_FS_READ = "fs.read"
+RESOURCE_FS_WRITE = "fs.write"
+
 
 def fs_file_state(path: str) -> str:
     """
@@ -43,10 +62,83 @@ def fs_file_state(path: str) -> str:
     return f"{FS_FILE_PREFIX}{path}"
 
 
+# Ranged reads of the file server: file://{path}/range/{offset}/{length}
+FILE_RANGE_RE = re.compile(r"^(?P<path>.*)/range/(?P<offset>\d+)/(?P<length>\d+)$")
+
+
+def file_uri_path(uri: str) -> str:
+    """
+    The file a file:// resource URI reads, whole or ranged.
+    """
+    path = uri.replace("file://", "").rstrip("/")
+    match = FILE_RANGE_RE.match(path)
+    return match.group("path") if match else path
+
+
+def db_user_row(user_id: int) -> str:
+    """
+    Canonical state key of one users row.
+    """
+    return f"{DB_USERS}:id={user_id}"
+
+
 # =========================
 # Database Contracts
 # =========================
 
+def literal_ids(values) -> Optional[list]:
+    """
+    The ids in `values` if all are known when planning, None if any of them
+    (or the list itself) comes from a $from reference.
+    """
+    if not isinstance(values, list):
+        return None
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, int):
+            return None
+    return values
+
+
+def user_rows_state(ids: Optional[list], write: bool) -> Dict[str, Set[str]]:
+    """
+    Row-level state for an operation on known ids; table-level when the
+    ids are only known at runtime.
+    """
+    if ids is None:
+        return {
+            "reads": {DB_USERS},
+            "writes": {DB_USERS, DB_USERS_INSERTS} if write else set(),
+        }
+
+    rows = {db_user_row(user_id) for user_id in ids}
+    return {
+        "reads": rows | {DB_USERS_INSERTS},
+        "writes": rows if write else set(),
+        "bumps": {DB_USERS} if write else set(),
+    }
+
+
+def insert_users_state_resolver(args: Dict) -> Dict[str, Set[str]]:
+    # New rows: touches no existing row, but changes the table and the row set
+    return {"reads": set(), "writes": {DB_USERS_INSERTS}, "bumps": {DB_USERS}}
+
+
+def read_user_state_resolver(args: Dict) -> Dict[str, Set[str]]:
+    return user_rows_state(literal_ids([args.get("id")]), write=False)
+
+
+def write_user_state_resolver(args: Dict) -> Dict[str, Set[str]]:
+    return user_rows_state(literal_ids([args.get("id")]), write=True)
+
+
+def read_users_state_resolver(args: Dict) -> Dict[str, Set[str]]:
+    return user_rows_state(literal_ids(args.get("ids")), write=False)
+
+
+def write_users_state_resolver(args: Dict) -> Dict[str, Set[str]]:
+    return user_rows_state(literal_ids(args.get("ids")), write=True)
+
+
 CREATE_USER = ToolContract(
     name="create_user",
     reads=set(),
@@ -57,6 +149,10 @@ CREATE_USER = ToolContract(
         "name": str,
         "email": str,
     },
+    state_resolver=insert_users_state_resolver,
+    expected_latency_ms=10,
+    payload_bytes=128,
+    resource_class=RESOURCE_DB_WRITE,
 )
 
 UPDATE_USER = ToolContract(
@@ -66,6 +162,10 @@ UPDATE_USER = ToolContract(
     idempotent=False,
     commutative=False,
     required_args={"id": int},
+    state_resolver=write_user_state_resolver,
+    expected_latency_ms=10,
+    payload_bytes=128,
+    resource_class=RESOURCE_DB_WRITE,
 )
 
 DELETE_USER = ToolContract(
@@ -75,6 +175,10 @@ DELETE_USER = ToolContract(
     idempotent=False,
     commutative=False,
     required_args={"id": int},
+    state_resolver=write_user_state_resolver,
+    expected_latency_ms=10,
+    payload_bytes=128,
+    resource_class=RESOURCE_DB_WRITE,
 )
 
 LIST_USERS = ToolContract(
@@ -84,6 +188,51 @@ LIST_USERS = ToolContract(
     idempotent=True,
     commutative=True,
     required_args={},
+    optional_args={
+        "name_filter": str,
+        "email_filter": str,
+        "name_prefix": str, # indexed, unlike the substring filters
+        "limit": int,       # keyset page size
+        "after_id": int,    # last id of the previous page
+        "as_blob": bool,    # return a helpers.blob_store ref instead of rows
+    },
+    expected_latency_ms=50,
+    payload_bytes=65536,
+    resource_class=RESOURCE_DB_READ,
+)
+
+STREAM_USERS = ToolContract(
+    name="stream_users",
+    reads={DB_USERS},
+    writes=set(),
+    idempotent=True,
+    commutative=True,
+    required_args={},
+    optional_args={
+        "page_size": int,
+        "name_filter": str,
+        "email_filter": str,
+        "name_prefix": str,
+    },
+    expected_latency_ms=200,
+    payload_bytes=256,
+    resource_class=RESOURCE_DB_READ,
+)
+
+SEARCH_USERS = ToolContract(
+    name="search_users",
+    reads={DB_USERS},
+    writes=set(),
+    idempotent=True,
+    commutative=True,
+    required_args={"query": str},
+    optional_args={
+        "field": str,   # "name" or "email"
+        "limit": int,
+    },
+    expected_latency_ms=10,
+    payload_bytes=2048,
+    resource_class=RESOURCE_DB_READ,
 )
 
 GET_USER_BY_ID = ToolContract(
@@ -93,6 +242,88 @@ GET_USER_BY_ID = ToolContract(
     idempotent=True,
     commutative=True,
     required_args={"id": int},
+    state_resolver=read_user_state_resolver,
+    expected_latency_ms=5,
+    payload_bytes=128,
+    resource_class=RESOURCE_DB_READ,
+)
+
+
+# =========================
+# Batch Database Contracts
+# =========================
+
+CREATE_USERS = ToolContract(
+    name="create_users",
+    reads=set(),
+    writes={DB_USERS},
+    idempotent=False,
+    commutative=True,
+    required_args={"users": list},
+    state_resolver=insert_users_state_resolver,
+    expected_latency_ms=20,
+    payload_bytes=4096,
+    resource_class=RESOURCE_DB_WRITE,
+)
+
+GET_USERS_BY_IDS = ToolContract(
+    name="get_users_by_ids",
+    reads={DB_USERS},
+    writes=set(),
+    idempotent=True,
+    commutative=True,
+    required_args={"ids": list},
+    state_resolver=read_users_state_resolver,
+    expected_latency_ms=10,
+    payload_bytes=4096,
+    resource_class=RESOURCE_DB_READ,
+)
+
+DELETE_USERS = ToolContract(
+    name="delete_users",
+    reads={DB_USERS},
+    writes={DB_USERS},
+    idempotent=False,
+    commutative=False,
+    required_args={"ids": list},
+    state_resolver=write_users_state_resolver,
+    expected_latency_ms=20,
+    payload_bytes=4096,
+    resource_class=RESOURCE_DB_WRITE,
+)
+
+
+# =========================
+# Transaction Contract
+# =========================
+
+def transaction_state_resolver(args: Dict) -> Dict[str, Set[str]]:
+    """
+    Everything the grouped operations read, write and bump.
+    """
+    state = {"reads": set(), "writes": set(), "bumps": set()}
+    for op in args["operations"]:
+        contract = TOOL_CONTRACTS[op["tool"]]
+        if contract.state_resolver:
+            op_state = contract.state_resolver(op.get("arguments", {}))
+        else:
+            op_state = {"reads": contract.reads, "writes": contract.writes}
+        for field in state:
+            state[field] |= op_state.get(field, set())
+    return state
+
+
+RUN_TRANSACTION = ToolContract(
+    name="run_transaction",
+    reads={DB_USERS},
+    writes={DB_USERS},
+    idempotent=False,
+    commutative=False,
+    required_args={"operations": list},
+    state_resolver=transaction_state_resolver,
+    expected_latency_ms=25,
+    payload_bytes=2048,
+    resource_class=RESOURCE_DB_WRITE,
 )
 
 
@@ -100,24 +331,16 @@ GET_USER_BY_ID = ToolContract(
 # File Tool Contracts
 # =========================
 
-# NEW: write_file dynamically depends on DB_USERS *if content references users*
+# NEW: write_file state is the file it writes
 def write_file_state_resolver(args: Dict) -> Dict[str, Set[str]]:
     """
-    NEW:
-    - Writes exactly ONE file
-    - Reads db.users IF content originated from list_users
+    Writes exactly ONE file. Where its content comes from is a data
+    dependency, expressed with $from (see helpers.create_DAG).
     """
     path = args["path"]
-    content = args.get("content", "")
-
-    reads = set()
-
-    # NEW: Heuristic — writing derived user data requires db.users
-    if "user" in content or "users" in content:
-        reads.add(DB_USERS)
 
     return {
-        "reads": reads,
+        "reads": set(),
         "writes": {fs_file_state(path)},
     }
 
@@ -133,13 +356,44 @@ WRITE_FILE = ToolContract(
         "content": object,  #allow dict / list / any
     },
     state_resolver=write_file_state_resolver,
+    expected_latency_ms=10,
+    payload_bytes=128,
+    resource_class=RESOURCE_FS_WRITE,
+)
+
+
+# append_file continues the file at its current size: it reads it too
+def append_file_state_resolver(args: Dict) -> Dict[str, Set[str]]:
+    state = fs_file_state(args["path"])
+
+    return {
+        "reads": {state},
+        "writes": {state},
+    }
+
+
+APPEND_FILE = ToolContract(
+    name="append_file",
+    reads=set(),     # resolved dynamically
+    writes=set(),    # resolved dynamically
+    idempotent=False,   # a repeated chunk is refused (offset check), not reapplied
+    commutative=False,  # chunks of one file go in order
+    required_args={
+        "path": str,
+        "data": str,
+        "offset": int,
+    },
+    optional_args={"encoding": str},
+    state_resolver=append_file_state_resolver,
+    expected_latency_ms=10,
+    payload_bytes=128,
+    resource_class=RESOURCE_FS_WRITE,
 )
 
 
 # NEW: read_file depends on the last writer of the file
 def read_file_state_resolver(args: Dict) -> Dict[str, Set[str]]:
-    uri = args["uri"]
-    path = uri.replace("file://", "").rstrip("/")
+    path = file_uri_path(args["uri"])
 
     return {
         "reads": {fs_file_state(path)},
@@ -155,6 +409,9 @@ READ_FILE = ToolContract(
     commutative=True,
     required_args={"uri": str},
     state_resolver=read_file_state_resolver,
+    expected_latency_ms=5,
+    payload_bytes=8192,
+    resource_class=RESOURCE_FS_READ,
 )
 
 
@@ -169,8 +426,15 @@ TOOL_CONTRACTS = {
         UPDATE_USER,
         DELETE_USER,
         LIST_USERS,
+        STREAM_USERS,
+        SEARCH_USERS,
         GET_USER_BY_ID,
+        CREATE_USERS,
+        GET_USERS_BY_IDS,
+        DELETE_USERS,
+        RUN_TRANSACTION,
         WRITE_FILE,
+        APPEND_FILE,
         READ_FILE,
     ]
 }
@@ -1,84 +1,185 @@
-import networkx as nx
-from collections import defaultdict
 from helpers.contracts import TOOL_CONTRACTS
+from helpers.dag_index import DependencyTracker, build_indexed_dag
+from helpers.event_log import DEBUG, enabled, event, get_logger
 
-def build_execution_dag(plan):
+log = get_logger(__name__)
+
+# "dataflow":     $from data dependencies plus contract read/write conflicts
+# "conservative": additionally serialize every file step after all earlier
+#                 db steps, for plans whose $from can't be trusted
+DEPENDENCY_MODES = ("dataflow", "conservative")
+
+
+def _argument_refs(value, refs):
+    # {"$from": "step_id"} / {"$from": ["a", "b"]} placeholders inside arguments
+    if isinstance(value, dict):
+        if "$from" in value:
+            ref = value["$from"]
+            refs.extend([ref] if isinstance(ref, str) else ref)
+        else:
+            for v in value.values():
+                _argument_refs(v, refs)
+    elif isinstance(value, list):
+        for v in value:
+            _argument_refs(v, refs)
+    return refs
+
+
+def from_dependencies(plan):
+    """
+    depends_on lists for build_indexed_dag: the steps each step takes data
+    from, through its top-level $from or $from placeholders in its arguments.
+    """
+    id_to_index = {}
+    for i, step in enumerate(plan):
+        for name in (step.get("id"), step.get("produces")):
+            if name is not None:
+                id_to_index[name] = i
+        # Batch steps also answer for the steps merged into them
+        for member in step.get("members", []):
+            id_to_index[member] = i
+
+    depends_on = []
+    for i, step in enumerate(plan):
+        refs = step.get("$from", [])
+        refs = [refs] if isinstance(refs, str) and refs else list(refs or [])
+        deps = set()
+        for ref in refs:
+            if ref not in id_to_index:
+                raise ValueError(f"Step '{step.get('id', i)}' references unknown step '{ref}'")
+            if id_to_index[ref] >= i:
+                raise ValueError(f"Step '{step.get('id', i)}' references future step '{ref}'")
+            deps.add(id_to_index[ref])
+        # Unknown placeholders resolve to None at runtime; they add no edge
+        for ref in _argument_refs(step.get("arguments", {}), []):
+            if id_to_index.get(ref, i) < i:
+                deps.add(id_to_index[ref])
+        depends_on.append(deps)
+    return depends_on
+
+
+def contract_state(step):
+    """
+    (reads, writes, commutative, bumps) of a step from its ToolContract,
+    or None for tools without one.
+    """
+    contract = TOOL_CONTRACTS.get(step.get("tool"))
+    if not contract:
+        return None
+
+    # Use dynamic state resolver if present
+    if contract.state_resolver:
+        state = contract.state_resolver(step.get("arguments", {}))
+        reads = state.get("reads", set())
+        writes = state.get("writes", set())
+        bumps = state.get("bumps", set())
+    else:
+        reads = contract.reads
+        writes = contract.writes
+        bumps = set()
+    return reads, writes, contract.commutative, bumps
+
+
+def _serialize_rule(dependencies):
+    if dependencies not in DEPENDENCY_MODES:
+        raise ValueError(
+            f"Unknown dependency mode '{dependencies}', expected one of {DEPENDENCY_MODES}"
+        )
+    if dependencies == "conservative":
+        return True
+    return lambda step: "$from" not in step
+
+
+class StreamingDependencies:
     """
-    Build a conservative DAG from an LLM-generated plan using safe assumptions.
+    depends_on for steps that arrive one at a time (execute_steps_dataflow):
+    called with each new step, returns the ids of the earlier steps it waits
+    for. Same edges as build_execution_dag on the whole plan, $from data
+    dependencies and contract read/write conflicts alike, without knowing
+    the steps that come later.
+    """
+
+    def __init__(self, dependencies="dataflow"):
+        self.serialize = _serialize_rule(dependencies)
+        self.tracker = DependencyTracker()
+        self.ids = {}   # id, produces name or batch member -> step id
+
+    def __call__(self, step):
+        step_id = step["id"]
+        deps = set()
+        refs = step.get("$from", [])
+        for ref in [refs] if isinstance(refs, str) and refs else list(refs or []):
+            if ref not in self.ids:
+                raise ValueError(f"Step '{step_id}' references unknown or future step '{ref}'")
+            deps.add(self.ids[ref])
+        # Unknown placeholders resolve to None at runtime; they add no edge
+        for ref in _argument_refs(step.get("arguments", {}), []):
+            if ref in self.ids:
+                deps.add(self.ids[ref])
+
+        serialize = self.serialize is True or self.serialize(step)
+        deps = self.tracker.add(step_id, contract_state(step), step.get("server"),
+                                serialize, deps)
 
-    Assumptions:
-    1. Plan only contains db_server (CRUD ops), file_server (read/write), or both.
-    2. If a file write/read happens after a DB write in the plan and content might include DB objects, serialize it.
+        for name in (step_id, step.get("produces"), *step.get("members", [])):
+            if name is not None:
+                self.ids[name] = step_id
+        return sorted(deps)
+
+
+def build_execution_dag(plan, transitive_reduction=False, verbose=True,
+                        dependencies="dataflow"):
     """
-    G = nx.DiGraph()
+    Build the execution DAG of an LLM-generated plan.
 
+    Plans only contain db_server (CRUD ops), file_server (read/write), or both.
+    Edges come from:
+    1. $from references (top-level or inside arguments): data dependencies.
+    2. ToolContract reads/writes: ordering of steps touching the same state.
+    3. dependencies="conservative" only: a file step after a DB step in the
+       plan might write DB objects, so it waits for every earlier DB step.
+       In "dataflow" mode this still applies to file steps that don't
+       declare $from at all.
+
+    Edges come from a per-state-key index (helpers.dag_index), so building is
+    linear in the plan size. transitive_reduction drops implied edges.
+    verbose logs the nodes and edges as DEBUG events.
+    """
     # Step 1: compute dynamic reads/writes for each node
-    node_reads = []
-    node_writes = []
-    contracts = []
-    for step in plan:
-        tool = step.get("tool")
-        contract = TOOL_CONTRACTS.get(tool)
-        contracts.append(contract)
-
-        if not contract:
-            node_reads.append(set())
-            node_writes.append(set())
-            continue
-
-        # Use dynamic state resolver if present
-        if contract.state_resolver:
-            state = contract.state_resolver(step.get("arguments", {}))
-            node_reads.append(state.get("reads", set()))
-            node_writes.append(state.get("writes", set()))
-        else:
-            node_reads.append(contract.reads)
-            node_writes.append(contract.writes)
+    states = [contract_state(step) for step in plan]
 
-    # Step 2: add nodes
-    for i, step in enumerate(plan):
-        G.add_node(i, step=step)
-
-    # Step 3: add edges based on conflicts and safe assumptions
-    n = len(plan)
-    for i in range(n):
-        for j in range(i + 1, n):
-            contract_i = contracts[i]
-            contract_j = contracts[j]
-
-            if not contract_i or not contract_j:
-                continue
-
-            # write/write conflict: only block if not commutative
-            conflict = node_writes[i] & node_writes[j]
-            if conflict and (not contract_i.commutative or not contract_j.commutative):
-                G.add_edge(i, j)
-
-            # read-after-write hazard
-            raw = node_writes[i] & node_reads[j]
-            if raw:
-                G.add_edge(i, j)
-
-            # New: heuristic to serialize file ops that might depend on DB writes
-            # If step j is a file write/read and step i is a DB write
-            server_i = plan[i].get("server")
-            server_j = plan[j].get("server")
-            if server_i == "db" and server_j == "file":
-                G.add_edge(i, j)  # serialize conservatively
-
-    print_dag_nodes(G)
-    print_dependency_tree(G)
+    serialize = _serialize_rule(dependencies)
+
+    # Step 2: nodes + data-flow and conflict edges
+    G = build_indexed_dag(
+        plan,
+        states,
+        serialize_db_before_file=serialize,
+        transitive_reduction=transitive_reduction,
+        depends_on=from_dependencies(plan),
+    )
+
+    if verbose:
+        print_dag_nodes(G)
+        print_dependency_tree(G)
     return G
 
 def print_dag_nodes(dag):
-    print("\n### DAG Nodes")
+    # DEBUG event; the listing is only built when that level is enabled
+    if not enabled(log, DEBUG):
+        return
+    nodes = []
     for node in sorted(dag.nodes):
-        step = dag.nodes[node]["step"]
-        tool = step.get("tool", "<resource>")
-        server = step.get("server", "")
-        print(f"{node}: {server}.{tool}")
+        step = dag.steps[node]
+        nodes.append((node, step.get("server", ""), step.get("tool", "<resource>")))
+    event(log, DEBUG, "dag.nodes", "\n### DAG Nodes\n%s",
+          "\n".join(f"{node}: {server}.{tool}" for node, server, tool in nodes),
+          nodes=nodes)
 
 def print_dependency_tree(dag):
-    print("\n### Dependency Structure\n")
-    for src, dst in sorted(dag.edges):
-        print(f"{src} ─▶ {dst}")
+    if not enabled(log, DEBUG):
+        return
+    edges = sorted(dag.edges)
+    event(log, DEBUG, "dag.edges", "\n### Dependency Structure\n\n%s",
+          "\n".join(f"{src} ─▶ {dst}" for src, dst in edges),
+          edges=edges)
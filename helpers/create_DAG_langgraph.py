@@ -1,20 +1,23 @@
-import networkx as nx
+from helpers.compact_dag import CompactDAG
+from helpers.event_log import DEBUG, enabled, event, get_logger
 
-def build_execution_dag(plan):
+log = get_logger(__name__)
+
+def build_execution_dag(plan, verbose=True):
     """
     Build a DAG from a plan using top-level $from dependencies.
     """
 
-    G = nx.DiGraph()
+    edges = []
 
     # Step 1: map step id to index
     id_to_index = {step["id"]: i for i, step in enumerate(plan)}
-
-    # Step 2: add nodes
+    # Batch steps also answer for the steps merged into them
     for i, step in enumerate(plan):
-        G.add_node(i, step=step)
+        for member in step.get("members", []):
+            id_to_index[member] = i
 
-    # Step 3: add edges from top-level $from
+    # Step 2: add edges from top-level $from
     for i, step in enumerate(plan):
         step_from = step.get("$from", [])
         # Normalize to list
@@ -32,23 +35,32 @@ def build_execution_dag(plan):
                     f"Step '{step['id']}' references future step '{ref}'"
                 )
             # Add DAG edge
-            G.add_edge(dep_idx, i)
+            edges.append((dep_idx, i))
 
-    print_dag_nodes(G)
-    print_dependency_tree(G)
+    G = CompactDAG(plan, edges)
+    if verbose:
+        print_dag_nodes(G)
+        print_dependency_tree(G)
     return G
 
 
 def print_dag_nodes(dag):
-    print("\n### DAG Nodes")
+    # DEBUG event; the listing is only built when that level is enabled
+    if not enabled(log, DEBUG):
+        return
+    nodes = []
     for node in sorted(dag.nodes):
-        step = dag.nodes[node]["step"]
-        tool = step.get("tool", "<resource>")
-        server = step.get("server", "")
-        print(f"{node}: {server}.{tool}")
+        step = dag.steps[node]
+        nodes.append((node, step.get("server", ""), step.get("tool", "<resource>")))
+    event(log, DEBUG, "dag.nodes", "\n### DAG Nodes\n%s",
+          "\n".join(f"{node}: {server}.{tool}" for node, server, tool in nodes),
+          nodes=nodes)
 
 
 def print_dependency_tree(dag):
-    print("\n### Dependency Structure\n")
-    for src, dst in sorted(dag.edges):
-        print(f"{src} ─▶ {dst}")
+    if not enabled(log, DEBUG):
+        return
+    edges = sorted(dag.edges)
+    event(log, DEBUG, "dag.edges", "\n### Dependency Structure\n\n%s",
+          "\n".join(f"{src} ─▶ {dst}" for src, dst in edges),
+          edges=edges)
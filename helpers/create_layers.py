@@ -1,6 +1,9 @@
-import networkx as nx
+from helpers.compact_dag import CompactDAG
+from helpers.event_log import DEBUG, enabled, event, get_logger
 
-def build_execution_layers(dag: nx.DiGraph):
+log = get_logger(__name__)
+
+def build_execution_layers(dag: CompactDAG):
     """
     Convert a DAG into execution layers.
 
@@ -9,29 +12,36 @@ def build_execution_layers(dag: nx.DiGraph):
     - Can be executed in parallel
     """
     layers = []
-    remaining = dag.copy()
-
-    while remaining.nodes:
-        # Nodes with no incoming edges (ready to run)
-        ready = [
-            node for node in remaining.nodes
-            if remaining.in_degree(node) == 0
-        ]
-
-        if not ready:
-            raise RuntimeError("Cycle detected in execution DAG")
+    # Kahn waves over a copy of the in-degree array; the DAG itself is not touched
+    in_degree = dag.in_degrees()
+    ready = [node for node in dag.nodes if in_degree[node] == 0]
+    scheduled = 0
 
+    while ready:
         # New: sort nodes to preserve plan order for deterministic execution
         ready.sort()
-
         layers.append(ready)
-        remaining.remove_nodes_from(ready)
+        scheduled += len(ready)
+
+        next_ready = []
+        for node in ready:
+            for succ in dag.successors(node):
+                in_degree[succ] -= 1
+                if in_degree[succ] == 0:
+                    next_ready.append(succ)
+        ready = next_ready
+
+    if scheduled != len(dag):
+        raise RuntimeError("Cycle detected in execution DAG")
 
     print_layered_dag(layers)
     return layers
 
 
 def print_layered_dag(layers):
-    print("\n### Execution Layers (Parallel View)\n")
-    for i, layer in enumerate(layers):
-        print(f"Layer {i}: ", "  ".join(str(n) for n in layer))
+    if not enabled(log, DEBUG):
+        return
+    event(log, DEBUG, "dag.layers", "\n### Execution Layers (Parallel View)\n\n%s",
+          "\n".join(f"Layer {i}:  " + "  ".join(str(n) for n in layer)
+                    for i, layer in enumerate(layers)),
+          layers=layers)
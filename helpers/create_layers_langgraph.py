@@ -1,4 +1,7 @@
-import networkx as nx
+from helpers.event_log import DEBUG, enabled, event, get_logger
+
+log = get_logger(__name__)
+
 
 def build_execution_layers(dag, plan):
     """
@@ -8,9 +11,9 @@ def build_execution_layers(dag, plan):
 
     layers = []
     # Compute in-degree for all nodes
-    in_degree = {n: dag.in_degree(n) for n in dag.nodes}
+    in_degree = dag.in_degrees()
     # Nodes with zero in-degree are ready to run
-    ready = [n for n, deg in in_degree.items() if deg == 0]
+    ready = [n for n in dag.nodes if in_degree[n] == 0]
 
     while ready:
         # Add current ready nodes as a layer
@@ -26,9 +29,11 @@ def build_execution_layers(dag, plan):
 
         ready = next_ready
 
-    # Print layers nicely
-    for i, layer in enumerate(layers):
-        layer_tools = [f"{n}:{plan[n]['tool']}" for n in layer]
-        print(f"Layer {i}: {layer_tools}")
+    # Log layers nicely
+    if enabled(log, DEBUG):
+        for i, layer in enumerate(layers):
+            layer_tools = [f"{n}:{plan[n]['tool']}" for n in layer]
+            event(log, DEBUG, "dag.layer", "Layer %d: %s", i, layer_tools,
+                  layer=i, nodes=layer)
 
     return layers
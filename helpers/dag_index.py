@@ -0,0 +1,135 @@
+from helpers.compact_dag import CompactDAG
+
+# =========================
+# Indexed DAG construction
+# =========================
+
+
+class StateIndex:
+    """
+    Per state key: the current write generation and the readers since it.
+
+    A generation is either one non-commutative writer or a group of
+    commutative writers with no reader in between. Every new generation
+    depends on the readers of the previous one (or, if there were none, on
+    its writers), so earlier writes stay reachable without extra edges and
+    each step only looks at the keys it touches instead of every earlier step.
+    """
+
+    def __init__(self):
+        self.writers = {}       # key -> nodes of the current write generation
+        self.commutative = {}   # key -> True if that generation is a commutative group
+        self.group_deps = {}    # key -> dependencies shared by the whole group
+        self.readers = {}       # key -> readers since the current generation
+
+    def read(self, node, key) -> set:
+        """
+        Register `node` as a reader of `key`; returns the writers it must wait for.
+        """
+        self.readers.setdefault(key, set()).add(node)
+        return self.writers.get(key, set())
+
+    def write(self, node, key, commutative: bool) -> set:
+        """
+        Register `node` as a writer of `key`; returns the steps it must wait for.
+        """
+        readers = self.readers.get(key)
+
+        if commutative and self.commutative.get(key) and not readers:
+            # Join the running group of commutative writers
+            self.writers[key].add(node)
+            return self.group_deps[key]
+
+        # Readers since the last write already wait for every writer of it
+        deps = (readers - {node}) if readers else set()
+        if not deps:
+            deps = self.writers.get(key, set())
+
+        self.writers[key] = {node}
+        self.commutative[key] = commutative
+        self.group_deps[key] = deps
+        self.readers[key] = set()
+        return deps
+
+
+class DependencyTracker:
+    """
+    The dependencies of nodes added one at a time in plan order: a
+    StateIndex plus the frontier of db nodes for serialize_db_before_file.
+    build_indexed_dag runs a whole plan through it; a streaming executor
+    adds steps as they arrive.
+    """
+
+    def __init__(self):
+        self.index = StateIndex()
+        self.db_frontier = set()
+
+    def add(self, node, state, server=None, serialize=False, deps=()) -> set:
+        """
+        Register `node` and return the earlier nodes it waits for.
+
+        state:     (reads, writes, commutative[, bumps]) or None
+        serialize: wait for the db frontier (a file step that may depend on
+                   earlier db steps it doesn't reference)
+        deps:      extra earlier nodes, e.g. its $from data dependencies
+        """
+        deps = set(deps)
+        if state is None:
+            return deps
+        reads, writes, commutative = state[:3]
+        bumps = state[3] if len(state) > 3 else ()
+
+        for key in reads:
+            deps.update(self.index.read(node, key))
+        for key in writes:
+            deps.update(self.index.write(node, key, commutative))
+        for key in bumps:
+            deps.update(self.index.write(node, key, True))
+
+        if server == "file" and serialize:
+            deps.update(self.db_frontier)
+        deps.discard(node)
+
+        if server == "db":
+            self.db_frontier.difference_update(deps)
+            self.db_frontier.add(node)
+        return deps
+
+
+def build_indexed_dag(plan, states, serialize_db_before_file=False, transitive_reduction=False,
+                      depends_on=None):
+    """
+    Build the execution DAG in one pass over the plan.
+
+    states[i] is (reads, writes, commutative, bumps) for step i, or None for
+    steps without a contract (they get no edges). bumps are keys written
+    commutatively whatever `commutative` says: row writes bump their table
+    key, so they don't order each other but table readers wait for them.
+    The 3-tuple form (no bumps) is accepted too.
+
+    serialize_db_before_file: every file step waits for all earlier db steps
+    (True), or only the file steps a predicate on the step selects. Only the
+    db "frontier" (db steps no later db step depends on directly) is linked,
+    the rest is reachable through it.
+
+    depends_on[i]: extra (earlier) nodes step i waits for, e.g. its $from
+    data dependencies.
+
+    transitive_reduction: drop edges implied by longer paths.
+    """
+    edges = []
+    tracker = DependencyTracker()
+
+    for j, state in enumerate(states):
+        server = plan[j].get("server")
+        serialize = bool(serialize_db_before_file) and (
+            serialize_db_before_file is True or bool(serialize_db_before_file(plan[j]))
+        )
+        deps = tracker.add(j, state, server, serialize,
+                           depends_on[j] if depends_on else ())
+        edges.extend((d, j) for d in deps)
+
+    dag = CompactDAG(plan, edges)
+    if transitive_reduction:
+        dag = dag.transitive_reduction()
+    return dag
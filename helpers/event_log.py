@@ -0,0 +1,152 @@
+import logging
+import os
+import re
+import sys
+from logging import DEBUG, ERROR, INFO, WARNING
+from typing import Optional, TextIO
+
+from helpers import codec
+
+# =========================
+# Structured event log
+# =========================
+#
+# Executors, DAG builders and helpers report through named events instead of
+# print():
+#
+#     log = get_logger(__name__)
+#     event(log, INFO, "node.completed", "<-- Completed node %s", node, node=node)
+#
+# Nothing is formatted unless the level is enabled: the message is %-formatted
+# by the handler, lazy() defers any other work to that point, and dumps that
+# are costly to build (DAG, layers, server metadata, resource contents) sit
+# behind `if enabled(log, DEBUG):`.
+#
+# Levels: DEBUG for structure dumps and scheduler state, INFO for node
+# progress, WARNING for retries and fallbacks, ERROR for failures.
+#
+# Configured by configure() or, at import, from the environment:
+#   MCP_AGENT_LOG_LEVEL  level name, default INFO
+#   MCP_AGENT_LOG_JSON   append every event as one JSON object per line here
+#   MCP_AGENT_QUIET      "1": no output at all, every level check fails
+
+ROOT_LOGGER = "mcp_agent"
+LEVEL_ENV = "MCP_AGENT_LOG_LEVEL"
+JSON_ENV = "MCP_AGENT_LOG_JSON"
+QUIET_ENV = "MCP_AGENT_QUIET"
+
+# Above CRITICAL: isEnabledFor() is False for every level
+SILENT = logging.CRITICAL + 1
+
+ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Logger under the agent's root, e.g. get_logger(__name__).
+    """
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def enabled(log: logging.Logger, level: int) -> bool:
+    return log.isEnabledFor(level)
+
+
+def event(log: logging.Logger, level: int, name: str, msg: str, *args, **fields):
+    """
+    Emit event `name`. `msg % args` is the console line; `fields` are kept
+    as structured data for the JSON-lines sink.
+    """
+    if log.isEnabledFor(level):
+        log.log(level, msg, *args, extra={"event": name, "fields": fields}, stacklevel=2)
+
+
+class lazy:
+    """
+    Message argument computed only when the record is formatted:
+    event(log, INFO, ..., "%s", lazy(colorize_node, node, step)).
+    """
+
+    __slots__ = ("fn", "args")
+
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+
+    def __str__(self):
+        return str(self.fn(*self.args))
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """
+    One JSON object per record: time, level, logger, event name, the
+    message without terminal colors, and the event's fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = dict(getattr(record, "fields", {}))
+        entry.update(
+            ts=record.created,
+            level=record.levelname,
+            logger=record.name,
+            event=getattr(record, "event", None),
+            message=ANSI_RE.sub("", record.getMessage()),
+        )
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return codec.dumps(entry, default=str)
+
+
+def _level(level) -> int:
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level).upper())
+    if not isinstance(value, int):
+        raise ValueError(f"Unknown log level '{level}'")
+    return value
+
+
+def configure(level=None, json_path: Optional[str] = None, quiet: Optional[bool] = None,
+              console: bool = True, stream: Optional[TextIO] = None) -> logging.Logger:
+    """
+    (Re)configure the agent's logging; unset arguments come from the
+    environment. Replaces any handlers installed by an earlier call.
+
+    level:     minimum level (name or number), default INFO
+    json_path: also append events as JSON lines to this file
+    quiet:     drop everything; level checks fail before any formatting
+    console:   write plain messages to `stream` (stdout by default)
+    """
+    if level is None:
+        level = os.environ.get(LEVEL_ENV) or INFO
+    if json_path is None:
+        json_path = os.environ.get(JSON_ENV) or None
+    if quiet is None:
+        quiet = os.environ.get(QUIET_ENV, "").lower() in ("1", "true", "yes")
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.propagate = False
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()     # closes our JSON file, leaves stdout open
+
+    if quiet:
+        root.setLevel(SILENT)
+        return root
+
+    root.setLevel(_level(level))
+    if console:
+        handler = logging.StreamHandler(stream or sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        root.addHandler(handler)
+    if json_path:
+        handler = logging.FileHandler(json_path, encoding="utf-8")
+        handler.setFormatter(JSONLinesFormatter())
+        root.addHandler(handler)
+    if not root.handlers:
+        root.setLevel(SILENT)
+    return root
+
+
+if not logging.getLogger(ROOT_LOGGER).handlers:
+    configure()
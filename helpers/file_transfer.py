@@ -0,0 +1,152 @@
+import base64
+from typing import AsyncIterable, AsyncIterator, Iterable, Union
+
+from helpers.blob_store import BlobStore
+from helpers.contracts import file_uri_path
+from helpers.normalize_results import tool_payload
+
+# =========================
+# Chunked file transfer
+# =========================
+#
+# read_file returns a whole file as one resource string and write_file takes
+# the whole content as one argument. For large files the file server also has
+#   file://{path}/range/{offset}/{length}   bytes of a file (binary resource)
+#   append_file(path, data, offset)         one chunk written at offset
+# and the helpers below move a file chunk by chunk, holding one chunk at a
+# time in memory.
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# Largest range or append_file chunk the file server accepts
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+APPEND_TOOL = "append_file"
+
+Chunk = Union[bytes, str]
+
+
+def range_uri(path: str, offset: int, length: int) -> str:
+    return f"file://{path}/range/{offset}/{length}"
+
+
+def _resource_bytes(result) -> bytes:
+    chunk = b""
+    for content in result.contents:
+        if getattr(content, "blob", None) is not None:
+            chunk += base64.b64decode(content.blob)
+        else:
+            chunk += content.text.encode("utf-8")
+    return chunk
+
+
+async def read_file_chunks(session, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                           offset: int = 0) -> AsyncIterator[bytes]:
+    """
+    Yield the bytes of `path` from `offset` on, one ranged read per chunk.
+    A chunk shorter than chunk_size ends the file.
+    """
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}")
+    while True:
+        result = await session.read_resource(range_uri(path, offset, chunk_size))
+        chunk = _resource_bytes(result)
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        offset += len(chunk)
+
+
+async def _aiter(chunks):
+    if hasattr(chunks, "__aiter__"):
+        async for chunk in chunks:
+            yield chunk
+    else:
+        for chunk in chunks:
+            yield chunk
+
+
+def _pieces(chunk: Chunk):
+    """
+    append_file arguments for one chunk: text goes as is, bytes as base64,
+    and anything over MAX_CHUNK_SIZE is split.
+    """
+    if isinstance(chunk, str):
+        if len(chunk) * 4 <= MAX_CHUNK_SIZE:     # at most 4 UTF-8 bytes per character
+            yield chunk, "utf-8"
+            return
+        chunk = chunk.encode("utf-8")
+    for start in range(0, len(chunk), MAX_CHUNK_SIZE):
+        piece = chunk[start:start + MAX_CHUNK_SIZE]
+        yield base64.b64encode(piece).decode("ascii"), "base64"
+
+
+async def write_file_chunks(session, path: str,
+                            chunks: Union[AsyncIterable[Chunk], Iterable[Chunk]]) -> dict:
+    """
+    Write `path` from chunks (bytes or str, sync or async iterable) with one
+    append_file call per chunk, as they arrive. The first call starts the
+    file over. Returns the last append_file result (path, status, size).
+    """
+    offset = 0
+    result = None
+    async for chunk in _aiter(chunks):
+        for data, encoding in _pieces(chunk):
+            result = await _append(session, path, data, offset, encoding)
+            offset = result["size"]
+    if result is None:
+        # No chunks: still leave an empty file behind
+        result = await _append(session, path, "", 0, "utf-8")
+    return result
+
+
+async def _append(session, path, data, offset, encoding) -> dict:
+    result = await session.call_tool(APPEND_TOOL, {
+        "path": path, "data": data, "offset": offset, "encoding": encoding,
+    })
+    if result.isError:
+        text = result.content[0].text if result.content else ""
+        raise RuntimeError(f"{APPEND_TOOL} failed on '{path}' at offset {offset}: {text}")
+    return tool_payload(result)
+
+
+async def download(session, path: str, local_path: str,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Copy a file from the file server to `local_path`. Returns its size.
+    """
+    size = 0
+    with open(local_path, "wb") as f:
+        async for chunk in read_file_chunks(session, path, chunk_size):
+            f.write(chunk)
+            size += len(chunk)
+    return size
+
+
+async def upload(session, local_path: str, path: str,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    Copy `local_path` to the file server as `path`.
+    """
+    def read_chunks(f):
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+    with open(local_path, "rb") as f:
+        return await write_file_chunks(session, path, read_chunks(f))
+
+
+async def read_file_to_blob(session, uri: str, store: BlobStore,
+                            chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    Stream the file behind a read_file URI into the blob store.
+    Returns a raw blob ref {"blob": "blob://<sha256>", "bytes": size,
+    "raw": True}: the file's bytes as they are, get_json() decodes them.
+    """
+    writer = store.writer()
+    try:
+        async for chunk in read_file_chunks(session, file_uri_path(uri), chunk_size):
+            writer.write(chunk)
+    except BaseException:
+        writer.abort()
+        raise
+    return {"blob": writer.close(), "bytes": writer.size, "raw": True}
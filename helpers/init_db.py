@@ -15,6 +15,71 @@ c.execute("""
   )
 """)
 
+# Indexes
+# email lookups; emails are not unique (plans may create the same user twice).
+# Replace the UNIQUE / _nonunique variants an earlier version of this script made
+c.execute("DROP INDEX IF EXISTS idx_users_email_nonunique")
+if c.execute(
+    "SELECT 1 FROM pragma_index_list('users') WHERE name = 'idx_users_email' AND \"unique\""
+).fetchone():
+    c.execute("DROP INDEX idx_users_email")
+c.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users (email)")
+
+# LIKE is case-insensitive, so list_users' name_prefix filter (name LIKE 'x%')
+# needs a NOCASE index
+c.execute("CREATE INDEX IF NOT EXISTS idx_users_name ON users (name COLLATE NOCASE)")
+
+# Full-text search shadow table (external content = users), kept in sync by triggers
+c.execute("""
+  CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+    name, email,
+    content='users', content_rowid='id',
+    prefix='2 3'
+  )
+""")
+c.executescript("""
+  CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+    INSERT INTO users_fts (rowid, name, email) VALUES (new.id, new.name, new.email);
+  END;
+  CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+    INSERT INTO users_fts (users_fts, rowid, name, email) VALUES ('delete', old.id, old.name, old.email);
+  END;
+  CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE ON users BEGIN
+    INSERT INTO users_fts (users_fts, rowid, name, email) VALUES ('delete', old.id, old.name, old.email);
+    INSERT INTO users_fts (rowid, name, email) VALUES (new.id, new.name, new.email);
+  END;
+""")
+# Index rows that existed before the triggers
+c.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+
+# Per-state-key version counters (keys as in helpers/contracts.py), bumped in
+# the writing transaction itself. The state_version tool exposes them so
+# speculative reads can check nothing they read changed (helpers/speculation.py)
+c.execute("""
+  CREATE TABLE IF NOT EXISTS state_versions (
+    key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+  ) WITHOUT ROWID
+""")
+c.executescript("""
+  CREATE TRIGGER IF NOT EXISTS users_version_ai AFTER INSERT ON users BEGIN
+    INSERT INTO state_versions (key, version)
+      VALUES ('db.users', 1), ('db.users:inserts', 1), ('db.users:id=' || new.id, 1)
+      ON CONFLICT (key) DO UPDATE SET version = version + 1;
+  END;
+  CREATE TRIGGER IF NOT EXISTS users_version_ad AFTER DELETE ON users BEGIN
+    INSERT INTO state_versions (key, version)
+      VALUES ('db.users', 1), ('db.users:id=' || old.id, 1)
+      ON CONFLICT (key) DO UPDATE SET version = version + 1;
+  END;
+  CREATE TRIGGER IF NOT EXISTS users_version_au AFTER UPDATE ON users BEGIN
+    INSERT INTO state_versions (key, version)
+      VALUES ('db.users', 1), ('db.users:id=' || old.id, 1), ('db.users:id=' || new.id, 1)
+      ON CONFLICT (key) DO UPDATE SET version = version + 1;
+  END;
+""")
+conn.commit()
+
 # Insert sample rows
 
 #c.executemany("INSERT INTO users (name, email) VALUES (?, ?)", [
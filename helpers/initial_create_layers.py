@@ -1,22 +1,24 @@
-import networkx as nx
-def build_execution_layers(dag: nx.DiGraph): 
+from helpers.compact_dag import CompactDAG
+def build_execution_layers(dag: CompactDAG): 
     """ Convert a DAG into execution layers. Each layer is a list of node IDs 
     that: 
     - Have no remaining dependencies 
     - Can be executed in parallel 
     """
     layers = [] 
-    remaining = dag.copy()
-    while remaining.nodes:
-      # Nodes with no incoming edges 
-      ready =  [ 
-         node for node in remaining.nodes
-           if remaining.in_degree(node) == 0
-           ]
-      if not ready: 
-         raise RuntimeError("Cycle detected in execution DAG") 
+    in_degree = dag.in_degrees()
+    ready = [node for node in dag.nodes if in_degree[node] == 0]
+    while ready:
       layers.append(ready)
-      remaining.remove_nodes_from(ready)
+      next_ready = []
+      for node in ready:
+         for succ in dag.successors(node):
+            in_degree[succ] -= 1
+            if in_degree[succ] == 0:
+               next_ready.append(succ)
+      ready = next_ready
+    if sum(len(layer) for layer in layers) != len(dag): 
+       raise RuntimeError("Cycle detected in execution DAG") 
     
     print_layered_dag(layers)  
     return layers
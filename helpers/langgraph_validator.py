@@ -1,5 +1,8 @@
 import re
 from helpers.contracts import TOOL_CONTRACTS
+from helpers.event_log import DEBUG, INFO, event, get_logger
+
+log = get_logger(__name__)
 
 VALID_SERVERS = {"db", "file"}
 VALID_TYPES = {"tool", "resource"}
@@ -34,7 +37,8 @@ def validate_step(step: dict, seen_ids: set):
 
     # ---------- tool ----------
     tool_name = step["tool"]
-    print(f"Validating: {tool_name} against the contract")
+    event(log, DEBUG, "plan.validate_step", "Validating: %s against the contract", tool_name,
+          tool=tool_name)
 
     if tool_name not in TOOL_CONTRACTS:
         raise ValueError(f"Unknown tool '{tool_name}' in step '{step_id}'")
@@ -131,5 +135,5 @@ def validate_plan(plan: list):
         elif len(from_refs) > 1 and not isinstance(from_field, list):
             raise ValueError(f"Multiple $from must be a list in step '{step_id}'")
 
-    print("------- Plan is Valid -----")
+    event(log, INFO, "plan.valid", "------- Plan is Valid -----", steps=len(plan))
     return True
@@ -0,0 +1,132 @@
+import asyncio
+import random
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+
+from helpers import codec
+from helpers.event_log import WARNING, event, get_logger
+
+# =========================
+# Ollama defaults
+# =========================
+
+OLLAMA_URL = "http://localhost:11434"
+DEFAULT_MODEL = "llama3"
+DEFAULT_OPTIONS = {"temperature": 0.0, "num_predict": 512}
+
+log = get_logger(__name__)
+
+
+class AsyncLLMClient:
+    """
+    Async Ollama client shared by the agents.
+
+    One httpx.AsyncClient keeps connections alive across calls, so several
+    plans can be generated concurrently without blocking the event loop.
+    Transport errors, timeouts and 5xx responses are retried with jittered
+    exponential backoff. Cancelling the awaiting task cancels the request.
+    """
+
+    def __init__(self, base_url: str = OLLAMA_URL, model: str = DEFAULT_MODEL,
+                 timeout: float = 600, max_connections: int = 8,
+                 max_retries: int = 3, backoff_base: float = 1.0,
+                 backoff_max: float = 30.0):
+        self.model = model
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Full-jitter exponential backoff for the given (1-based) attempt.
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def request_options(self, options: Optional[Dict] = None) -> Dict:
+        """
+        Model and merged options a request with `options` is sent with,
+        i.e. what its answer depends on (plan cache keys).
+        """
+        return {"model": self.model, "options": {**DEFAULT_OPTIONS, **(options or {})}}
+
+    def _payload(self, prompt: str, options: Optional[Dict], stream: bool) -> Dict:
+        return {
+            **self.request_options(options),
+            "prompt": prompt,
+            "stream": stream,
+        }
+
+    @staticmethod
+    def _retryable(error: Exception) -> bool:
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500
+        return isinstance(error, httpx.TransportError)
+
+    async def generate(self, prompt: str, options: Optional[Dict] = None) -> str:
+        """
+        Return the full response text of a non-streaming generate call.
+        """
+        last_error = None
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                response = await self._client.post(
+                    "/api/generate", json=self._payload(prompt, options, stream=False)
+                )
+                response.raise_for_status()
+                return response.json()["response"]
+            except Exception as e:
+                if not self._retryable(e):
+                    raise
+                last_error = e
+                event(log, WARNING, "llm.retry", "LLM call failed (attempt %d): %s", attempt, e,
+                      attempt=attempt, error=str(e))
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.backoff(attempt))
+
+        raise RuntimeError(f"LLM failed after {self.max_retries} attempts: {last_error}")
+
+    async def stream(self, prompt: str, options: Optional[Dict] = None) -> AsyncIterator[str]:
+        """
+        Yield response text chunks as Ollama produces them.
+        Only the connection is retried; a stream that broke midway is not replayed.
+        """
+        started = False
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                async with self._client.stream(
+                    "POST", "/api/generate", json=self._payload(prompt, options, stream=True)
+                ) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        chunk = codec.loads(line)
+                        started = True
+                        yield chunk.get("response", "")
+                        if chunk.get("done"):
+                            return
+                    return
+            except Exception as e:
+                if started or not self._retryable(e) or attempt == self.max_retries:
+                    raise RuntimeError(f"LLM stream failed: {e}") from e
+                event(log, WARNING, "llm.stream_retry", "LLM stream failed to start (attempt %d): %s",
+                      attempt, e, attempt=attempt, error=str(e))
+                await asyncio.sleep(self.backoff(attempt))
@@ -1,4 +1,33 @@
-import json
+from helpers import codec
+
+
+def tool_payload(result):
+    """
+    Plain Python value of one tool result, decoded once.
+
+    Servers that declare typed results send structuredContent, already
+    parsed with the JSON-RPC message: it is used as is (unwrapped from
+    {"result": ...} for non-object results). Otherwise every text item is
+    parsed; several items give a list.
+    """
+    structured = getattr(result, "structuredContent", None)
+    if structured is not None:
+        if set(structured) == {"result"}:
+            return structured["result"]
+        return structured
+
+    values = []
+    for item in result.content:
+        text = getattr(item, "text", None)
+        if text is None:
+            values.append(item)
+            continue
+        try:
+            values.append(codec.loads(text))
+        except codec.JSONDecodeError:
+            values.append(text)
+    return values[0] if len(values) == 1 else values
+
 
 def normalize_results(results):
     normalized = []
@@ -18,8 +47,8 @@ def normalize_results(results):
         if hasattr(item, "content"):
             for tc in item.content:
                 try:
-                    normalized.append(json.loads(tc.text))
-                except json.JSONDecodeError:
+                    normalized.append(codec.loads(tc.text))
+                except codec.JSONDecodeError:
                     pass
             continue
 
@@ -27,8 +56,8 @@ def normalize_results(results):
         if hasattr(item, "contents"):
             for rc in item.contents:
                 try:
-                    normalized.append(json.loads(rc.text))
-                except json.JSONDecodeError:
+                    normalized.append(codec.loads(rc.text))
+                except codec.JSONDecodeError:
                     pass
 
     return normalized
@@ -0,0 +1,127 @@
+import asyncio
+
+from helpers import codec
+from helpers.blob_store import BlobStore, encode_json
+
+# Default number of users fetched per list_users page
+DEFAULT_PAGE_SIZE = 500
+
+
+def rows_from_result(result) -> list:
+    """
+    Extract the list of rows from a list_users CallToolResult.
+    Prefers structuredContent and falls back to parsing text content.
+    """
+    if result.isError:
+        text = result.content[0].text if result.content else ""
+        raise RuntimeError(f"list_users failed: {text}")
+
+    if result.structuredContent:
+        rows = result.structuredContent.get("result")
+        if isinstance(rows, list):
+            return rows
+
+    rows = []
+    for item in result.content:
+        value = codec.loads(item.text)
+        if isinstance(value, list):
+            rows.extend(value)
+        else:
+            rows.append(value)
+    return rows
+
+
+async def iter_user_pages(session, page_size: int = DEFAULT_PAGE_SIZE, **filters):
+    """
+    Yield list_users pages using keyset pagination (limit + after_id).
+    Every page is a separate, bounded MCP message.
+    """
+    after_id = None
+    while True:
+        args = {**filters, "limit": page_size}
+        if after_id is not None:
+            args["after_id"] = after_id
+
+        page = rows_from_result(await session.call_tool("list_users", args))
+        if not page:
+            return
+        yield page
+
+        if len(page) < page_size:
+            return
+        after_id = page[-1]["id"]
+
+
+async def stream_user_pages(session, page_size: int = DEFAULT_PAGE_SIZE, **filters):
+    """
+    Streaming mode: a single stream_users call whose pages arrive as
+    progress notifications. Pages are yielded as soon as they are received.
+    """
+    pages = asyncio.Queue()
+
+    async def on_progress(progress, total, message):
+        if message:
+            pages.put_nowait(codec.loads(message))
+
+    call = asyncio.create_task(
+        session.call_tool(
+            "stream_users",
+            {**filters, "page_size": page_size},
+            progress_callback=on_progress,
+        )
+    )
+
+    try:
+        while True:
+            getter = asyncio.create_task(pages.get())
+            done, _ = await asyncio.wait({getter, call}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield getter.result()
+                continue
+
+            getter.cancel()
+            # Progress notifications are delivered before the final response
+            while not pages.empty():
+                yield pages.get_nowait()
+
+            result = call.result()
+            if result.isError:
+                text = result.content[0].text if result.content else ""
+                raise RuntimeError(f"stream_users failed: {text}")
+            return
+    finally:
+        if not call.done():
+            call.cancel()
+
+
+def user_pages(session, page_size: int = DEFAULT_PAGE_SIZE, stream: bool = False, **filters):
+    """
+    Pick the page source: keyset paging over list_users, or stream_users.
+    """
+    if stream:
+        return stream_user_pages(session, page_size, **filters)
+    return iter_user_pages(session, page_size, **filters)
+
+
+async def pages_to_blob(pages, store: BlobStore) -> dict:
+    """
+    Write the rows of an async iterable of pages to the blob store as one
+    JSON array, page by page: the bytes are encode_json() of all the rows,
+    but only the current page is held in memory.
+    Returns {"blob": "blob://<sha256>", "count", "bytes"}, like list_users
+    with as_blob.
+    """
+    writer = store.writer()
+    count = 0
+    try:
+        async for page in pages:
+            for row in page:
+                # Rows nest one level into the array; JSON text has no raw newlines
+                item = encode_json(row).replace(b"\n", b"\n  ")
+                writer.write((b",\n  " if count else b"[\n  ") + item)
+                count += 1
+        writer.write(b"\n]" if count else b"[]")
+    except BaseException:
+        writer.abort()
+        raise
+    return {"blob": writer.close(), "count": count, "bytes": writer.size}
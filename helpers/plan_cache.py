@@ -0,0 +1,141 @@
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from typing import Callable, Dict, List, Optional
+
+from helpers import codec
+from helpers.event_log import WARNING, event, get_logger
+from helpers.prompts import PROMPT_VERSION
+
+# =========================
+# Persistent LLM plan cache
+# =========================
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".plan_cache.db"
+)
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 512
+
+log = get_logger(__name__)
+
+
+def normalize_request(text: str) -> str:
+    """
+    Normalize a prompt / user request for hashing: trim every line and
+    collapse whitespace runs. Case is kept, names and emails are data.
+    """
+    lines = (re.sub(r"\s+", " ", line).strip() for line in text.strip().splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+class PlanCache:
+    """
+    SQLite-backed cache of validated LLM plans.
+
+    Keys hash the prompt template version, the normalized request and the
+    model options, so any change to one of them is a miss. Entries expire
+    after `ttl_seconds` and the least recently used ones are evicted above
+    `max_entries`.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS plans (
+                key TEXT PRIMARY KEY,
+                plan TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(prompt: str, options: Dict, prompt_version: str = PROMPT_VERSION) -> str:
+        payload = codec.canonical(
+            {
+                "prompt_version": prompt_version,
+                "request": normalize_request(prompt),
+                "options": options,
+            }
+        )
+        return hashlib.sha256(payload).hexdigest()
+
+    def get(self, key: str) -> Optional[list]:
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT plan, created_at FROM plans WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None or now - row[1] > self.ttl_seconds:
+            if row is not None:
+                self._conn.execute("DELETE FROM plans WHERE key = ?", (key,))
+                self._conn.commit()
+            self.misses += 1
+            return None
+
+        self._conn.execute(
+            "UPDATE plans SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key)
+        )
+        self._conn.commit()
+        self.hits += 1
+        return codec.loads(row[0])
+
+    def put(self, key: str, plan: list, validate: Callable[[list], bool]) -> bool:
+        """
+        Store a plan only if it passes `validate` (e.g. validate_plan).
+        Returns True when the plan was stored.
+        """
+        try:
+            validate(plan)
+        except (ValueError, KeyError, TypeError) as e:
+            # Malformed plans can trip the validators before they raise ValueError
+            event(log, WARNING, "plan_cache.invalid", "Plan not cached, validation failed: %s", e,
+                  error=str(e))
+            return False
+
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO plans (key, plan, created_at, last_used, hits) "
+            "VALUES (?, ?, ?, ?, 0)",
+            (key, codec.dumps(plan), now, now),
+        )
+        self._evict(now)
+        self._conn.commit()
+        return True
+
+    def _evict(self, now: float):
+        self._conn.execute(
+            "DELETE FROM plans WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        self._conn.execute(
+            "DELETE FROM plans WHERE key NOT IN "
+            "(SELECT key FROM plans ORDER BY last_used DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    def plans(self) -> List[list]:
+        """
+        Every cached plan, most recently used first (expired ones included).
+        """
+        rows = self._conn.execute("SELECT plan FROM plans ORDER BY last_used DESC")
+        return [codec.loads(row[0]) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        entries = self._conn.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self):
+        self._conn.close()
@@ -1,3 +1,7 @@
+# Bump whenever the prompt template changes: cached plans are keyed on it
+PROMPT_VERSION = "3"
+
+
 def get_prompt():
     prompt = """
 You are an execution planner for an agent that can call tools via MCP.
@@ -9,7 +13,8 @@ The output is executable code, not a suggestion.
 Database tools (all on server "db"):
 {
   "get_user_by_id": ["id"],
-  "list_users": ["name_filter", "email_filter"],
+  "list_users": ["name_filter", "email_filter", "name_prefix", "limit", "after_id"],
+  "search_users": ["query", "field", "limit"],
   "create_user": ["name", "email"],
   "update_user": ["id", "name", "email"],
   "delete_user": ["id"]
@@ -78,6 +83,10 @@ Respond as a JSON array
 - Do NOT include explanations
 - Do NOT include placeholder content such as "...", "TODO", or invalid JSON
 
+### TOOL SELECTION
+1. To find users by a word or the start of a name/email, use search_users
+2. Use list_users only when ALL users (or a substring or name_prefix filter) are requested
+
 ### TOOL AUTHORITY RULES (CRITICAL)
 1. The planner MUST NOT invoke any tool unless it is explicitly required by the user request
 2. The planner MUST NOT introduce helper, aggregation, filtering, transformation, or intermediate tool calls
@@ -0,0 +1,180 @@
+import asyncio
+from collections import OrderedDict, defaultdict
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from helpers import codec
+from helpers.contracts import TOOL_CONTRACTS
+from helpers.routing import step_state
+
+# =========================
+# Read-only tool result cache
+# =========================
+
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class ResultCache:
+    """
+    Results of idempotent, write-free tools keyed by (server, tool, canonical
+    arguments). Each entry remembers the state keys its tool read and is
+    dropped as soon as any step writes one of them, so a cache shared across
+    plans only serves results no executed step has made stale. Writes made
+    outside the executors are not seen; call clear() after those.
+
+    Every state key carries a version bumped on write: a read that overlapped
+    a write of one of its keys is not stored. Identical reads in flight at
+    the same time share one call (fetch()).
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[str, Tuple[object, Set[str]]]" = OrderedDict()
+        self._by_state: Dict[str, Set[str]] = defaultdict(set)
+        self._versions: Dict[str, int] = defaultdict(int)
+        self._epoch = 0     # bumped by clear()
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    # ---------- step classification ----------
+
+    @staticmethod
+    def reads_of(step) -> Optional[Set[str]]:
+        """
+        State keys a cacheable step reads, or None if the step is not cacheable.
+        """
+        contract = TOOL_CONTRACTS.get(step["tool"])
+        state = step_state(step)
+        if contract is None or state is None:
+            return None
+        if not contract.idempotent or state["writes"] or state["bumps"]:
+            return None
+        return set(state["reads"])
+
+    @staticmethod
+    def writes_of(step) -> Optional[Set[str]]:
+        """
+        State keys a step writes or bumps; None when unknown (invalidate everything).
+        """
+        state = step_state(step)
+        return None if state is None else set(state["writes"]) | set(state["bumps"])
+
+    @staticmethod
+    def make_key(step, args, variant=None) -> str:
+        """
+        `variant` separates results of the same call kept in different shapes
+        (executor, paged or not).
+        """
+        return codec.dumps(
+            [step.get("server", "db"), step.get("type", "tool"), step["tool"], args, variant],
+            sort_keys=True,
+            default=str,
+        )
+
+    # ---------- lookups ----------
+
+    def get(self, key: str) -> Tuple[bool, object]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[0]
+
+    async def fetch(self, key: str, reads: Set[str], compute: Callable[[], Awaitable],
+                    store_if: Callable[[object], bool] = lambda value: True):
+        """
+        Return the cached value for `key`, join an identical call already in
+        flight, or run `compute()` and cache its result if `store_if` accepts it.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.hits += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The call we joined was cancelled, not us: run our own
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        snapshot = self.snapshot(reads)
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody may be waiting; don't warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+        future.set_result(value)
+        if store_if(value):
+            self.put(key, value, reads, snapshot)
+        return value
+
+    def snapshot(self, reads: Iterable[str]) -> Tuple[int, ...]:
+        """
+        Versions of `reads`; take one before executing, hand it to put().
+        """
+        return (self._epoch,) + tuple(self._versions.get(key, 0) for key in sorted(reads))
+
+    def put(self, key: str, value, reads: Set[str], snapshot: Tuple[int, ...]):
+        if self.snapshot(reads) != snapshot:
+            # A write to one of our keys landed while we were reading
+            return
+        self._entries[key] = (value, reads)
+        self._entries.move_to_end(key)
+        for state_key in reads:
+            self._by_state[state_key].add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest, (_, oldest_reads) = self._entries.popitem(last=False)
+            self._unindex(oldest, oldest_reads)
+
+    # ---------- invalidation ----------
+
+    def invalidate(self, writes: Optional[Set[str]]):
+        """
+        Drop every entry that read one of `writes` (everything if None).
+        """
+        if writes is None:
+            self.clear()
+            return
+        for state_key in writes:
+            self._versions[state_key] += 1
+            for key in self._by_state.pop(state_key, ()):
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._unindex(key, entry[1])
+
+    def clear(self):
+        self._epoch += 1
+        self._entries.clear()
+        self._by_state.clear()
+
+    def _unindex(self, key: str, reads: Set[str]):
+        for state_key in reads:
+            keys = self._by_state.get(state_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_state[state_key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
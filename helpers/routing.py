@@ -0,0 +1,81 @@
+from typing import Dict, Optional, Set, Tuple
+
+from helpers.contracts import TOOL_CONTRACTS
+
+# =========================
+# Read / write replica routing
+# =========================
+
+
+def step_state(step) -> Optional[Dict[str, Set[str]]]:
+    """
+    Reads/writes/bumps of a step according to its ToolContract
+    (state_resolver included). None when the tool has no contract or its
+    state cannot be resolved from the arguments.
+    """
+    contract = TOOL_CONTRACTS.get(step["tool"])
+    if contract is None:
+        return None
+
+    if contract.state_resolver:
+        try:
+            state = contract.state_resolver(step.get("arguments", {}))
+        except (KeyError, TypeError, ValueError):
+            return None
+        return {
+            "reads": state.get("reads", set()),
+            "writes": state.get("writes", set()),
+            "bumps": state.get("bumps", set()),
+        }
+
+    return {"reads": contract.reads, "writes": contract.writes, "bumps": set()}
+
+
+def is_read_only(step) -> bool:
+    """
+    True when a step can run on any replica: resources, or idempotent tools
+    whose contract writes nothing. Unknown tools are treated as writes.
+    """
+    if step.get("type", "tool") == "resource":
+        return True
+
+    state = step_state(step)
+    if state is None:
+        return False
+    return (TOOL_CONTRACTS[step["tool"]].idempotent
+            and not state["writes"] and not state["bumps"])
+
+
+class ReplicaRouter:
+    """
+    Picks the server replica a step runs on.
+
+    Writes always go to the designated writer (the first replica) so that
+    SQLite only ever sees one writing process. Read-only steps go to the
+    replica with the most free in-flight slots, rotating on ties. Replicas
+    share the WAL database file and the DAG only starts a read after the
+    writes it depends on have committed, so every replica sees them.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._next: Dict[str, int] = {}
+
+    def pick(self, step) -> str:
+        server = step.get("server", "db")
+        replicas = self.pool.replicas(server)
+        if len(replicas) == 1 or not is_read_only(step):
+            return replicas[0]
+
+        start = self._next.get(server, 0)
+        self._next[server] = (start + 1) % len(replicas)
+        rotated = replicas[start:] + replicas[:start]
+        return max(rotated, key=self.pool.limiter.available)
+
+    async def session_for(self, step) -> Tuple[str, object]:
+        """
+        Return (server key, session) for a step; the key is also the
+        limiter slot to hold while the request is in flight.
+        """
+        key = self.pick(step)
+        return key, await self.pool.session(key)
@@ -0,0 +1,87 @@
+import heapq
+from collections import defaultdict
+from typing import Dict, List, Sequence
+
+from helpers.compact_dag import CompactDAG
+from helpers.concurrency import DEFAULT_MAX_IN_FLIGHT
+
+# =========================
+# Critical-path list scheduling
+# =========================
+
+
+def critical_path_ranks(dag: CompactDAG, costs: Sequence[float]) -> List[float]:
+    """
+    rank(n) = cost(n) + max rank of its successors, i.e. the expected length
+    of the longest path from n to the end of the plan. Edges point forward in
+    plan order, so one backwards pass is enough.
+    """
+    ranks = [0.0] * len(dag)
+    for node in reversed(dag.nodes):
+        ranks[node] = costs[node] + max((ranks[s] for s in dag.successors(node)), default=0.0)
+    return ranks
+
+
+class CriticalPathScheduler:
+    """
+    Ready queue that hands out the most critical nodes first.
+
+    Each server has its own heap ordered by rank. dispatch() only releases as
+    many nodes as the server has capacity for, so when a server is saturated
+    the nodes waiting for it are the low-rank ones. Nodes released together
+    reach the limiter in rank order.
+    """
+
+    def __init__(self, dag: CompactDAG, plan: list, costs: Sequence[float],
+                 capacity: Dict[str, int]):
+        self.plan = plan
+        self.ranks = critical_path_ranks(dag, costs)
+        self.capacity = capacity
+
+        self._dag = dag
+        self._in_degree = dag.in_degrees()
+        self._ready: Dict[str, list] = defaultdict(list)
+        self._running: Dict[str, int] = defaultdict(int)
+
+        for node in dag.nodes:
+            if self._in_degree[node] == 0:
+                self._push(node)
+
+    def _server(self, node) -> str:
+        return self.plan[node].get("server", "db")
+
+    def _push(self, node):
+        heapq.heappush(self._ready[self._server(node)], (-self.ranks[node], node))
+
+    def has_ready(self) -> bool:
+        return any(self._ready.values())
+
+    def waiting(self) -> List[int]:
+        return sorted(node for heap in self._ready.values() for _, node in heap)
+
+    def dispatch(self) -> List[int]:
+        """
+        Pop every ready node that fits under its server's capacity,
+        most critical first.
+        """
+        launch = []
+        for server, heap in self._ready.items():
+            free = self.capacity.get(server, DEFAULT_MAX_IN_FLIGHT) - self._running[server]
+            while heap and free > 0:
+                _, node = heapq.heappop(heap)
+                launch.append(node)
+                self._running[server] += 1
+                free -= 1
+
+        launch.sort(key=lambda node: -self.ranks[node])
+        return launch
+
+    def complete(self, node):
+        """
+        Release the node's server slot and queue successors that became ready.
+        """
+        self._running[self._server(node)] -= 1
+        for succ in self._dag.successors(node):
+            self._in_degree[succ] -= 1
+            if self._in_degree[succ] == 0:
+                self._push(succ)
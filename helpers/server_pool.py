@@ -0,0 +1,225 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from mcp.client.session import ClientSession
+from mcp.client.stdio import stdio_client, StdioServerParameters
+
+from helpers.concurrency import ServerLimiter
+from helpers.event_log import ERROR, WARNING, event, get_logger
+
+log = get_logger(__name__)
+
+# ----------------- Default server parameters -----------------
+SERVER_PARAMS = {
+    "db": StdioServerParameters(
+        name="db",
+        command="python3",
+        args=["servers/db_server.py"]
+    ),
+    "file": StdioServerParameters(
+        name="file",
+        command="python3",
+        args=["servers/file_server.py"]
+    ),
+}
+
+DEFAULT_HEALTH_INTERVAL = 30.0
+DEFAULT_PING_TIMEOUT = 5.0
+
+# Replica i > 0 of server "db" is registered as "db#i"; "db" itself is the writer
+REPLICA_SEPARATOR = "#"
+
+
+class ManagedServer:
+    """
+    One server subprocess plus its initialized ClientSession.
+
+    stdio_client/ClientSession are entered and exited by a dedicated owner
+    task (anyio cancel scopes must close in the task that opened them), so
+    the server can be stopped or restarted from any other task.
+    """
+
+    def __init__(self, name: str, params: StdioServerParameters):
+        self.name = name
+        self.params = params
+        self.session: Optional[ClientSession] = None
+        self.init_result = None
+        self.restarts = 0
+        self._task: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._stop: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def _run(self):
+        try:
+            async with stdio_client(self.params) as (reader, writer):
+                async with ClientSession(reader, writer) as session:
+                    self.init_result = await session.initialize()
+                    self.session = session
+                    self._ready.set()
+                    await self._stop.wait()
+        finally:
+            self.session = None
+
+    async def start(self):
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+        ready = asyncio.create_task(self._ready.wait())
+        done, _ = await asyncio.wait({ready, self._task}, return_when=asyncio.FIRST_COMPLETED)
+        if self._task in done:
+            ready.cancel()
+            # Surface the startup failure; a clean exit before ready is still a failure
+            self._task.result()
+            raise RuntimeError(f"Server '{self.name}' exited during startup")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        try:
+            await self._task
+        except Exception as e:
+            event(log, ERROR, "pool.server_error", "[POOL] Server '%s' stopped with error: %s",
+                  self.name, e, server=self.name, error=str(e))
+        self._task = None
+
+    async def restart(self):
+        await self.stop()
+        await self.start()
+        self.restarts += 1
+
+    async def ping(self, timeout: float = DEFAULT_PING_TIMEOUT) -> bool:
+        if not self.running:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout)
+            return True
+        except Exception:
+            return False
+
+
+class MCPServerPool:
+    """
+    Long-lived pool of warm, initialized MCP server sessions.
+
+    Sessions are shared: ClientSession multiplexes concurrent requests, so
+    many plan executions can use the same servers at once, bounded by the
+    pool's shared per-server limiter. A background task pings each server
+    every `health_interval` seconds and restarts the ones that stopped
+    answering; session() also restarts a server whose process has exited.
+
+    replicas: optional {server: N} launching N processes of that server.
+    Each replica gets its own in-flight cap; helpers.routing.ReplicaRouter
+    decides which replica a step goes to.
+    """
+
+    def __init__(self, server_params: Optional[Dict[str, StdioServerParameters]] = None,
+                 max_in_flight: Optional[Dict[str, int]] = None,
+                 health_interval: float = DEFAULT_HEALTH_INTERVAL,
+                 ping_timeout: float = DEFAULT_PING_TIMEOUT,
+                 replicas: Optional[Dict[str, int]] = None):
+        params = server_params or SERVER_PARAMS
+        self.limiter = ServerLimiter(max_in_flight)
+        self.servers: Dict[str, ManagedServer] = {}
+        self.replica_names: Dict[str, List[str]] = {}
+
+        for name, p in params.items():
+            count = max((replicas or {}).get(name, 1), 1)
+            names = [name] + [f"{name}{REPLICA_SEPARATOR}{i}" for i in range(1, count)]
+            self.replica_names[name] = names
+            for replica in names:
+                self.servers[replica] = ManagedServer(replica, p)
+                self.limiter.limits.setdefault(replica, self.limiter.limit_for(name))
+
+        self.health_interval = health_interval
+        self.ping_timeout = ping_timeout
+        self._restart_locks = {name: asyncio.Lock() for name in self.servers}
+        self._health_task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def start(self):
+        await asyncio.gather(*(server.start() for server in self.servers.values()))
+        if self.health_interval:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def aclose(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        await asyncio.gather(*(server.stop() for server in self.servers.values()))
+
+    async def _restart(self, server: ManagedServer, force: bool = False):
+        async with self._restart_locks[server.name]:
+            # Another task may have restarted it while we waited for the lock
+            if server.running and not force:
+                return
+            event(log, WARNING, "pool.restart", "[POOL] Restarting server '%s'", server.name,
+                  server=server.name)
+            await server.restart()
+
+    def replicas(self, name: str) -> List[str]:
+        """
+        Server keys of every replica of `name`; the first one is the writer.
+        """
+        if name not in self.replica_names:
+            raise ValueError(f"Unknown server '{name}'")
+        return self.replica_names[name]
+
+    async def session(self, name: str) -> ClientSession:
+        if name not in self.servers:
+            raise ValueError(f"Unknown server '{name}'")
+        server = self.servers[name]
+        if not server.running:
+            await self._restart(server)
+        return server.session
+
+    async def check_health(self) -> Dict[str, bool]:
+        """
+        Ping every server and restart the ones that do not answer.
+        """
+        healthy = {}
+        for name, server in self.servers.items():
+            healthy[name] = await server.ping(self.ping_timeout)
+            if not healthy[name]:
+                await self._restart(server, force=True)
+        return healthy
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self.check_health()
+            except Exception as e:
+                event(log, WARNING, "pool.health_check_failed", "[POOL] Health check failed: %s", e,
+                      error=str(e))
+
+
+@asynccontextmanager
+async def borrow_pool(pool: Optional[MCPServerPool] = None,
+                      server_params: Optional[Dict[str, StdioServerParameters]] = None,
+                      max_in_flight: Optional[Dict[str, int]] = None):
+    """
+    Yield `pool` when the caller has one, otherwise a pool that only lives
+    for this block (the old spawn-per-plan behaviour).
+    """
+    if pool is not None:
+        yield pool
+        return
+    async with MCPServerPool(server_params, max_in_flight, health_interval=0) as temp_pool:
+        yield temp_pool
@@ -0,0 +1,126 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Iterable, Set
+
+from helpers import codec
+from helpers.compact_dag import CompactDAG
+from helpers.create_DAG import from_dependencies
+from helpers.event_log import WARNING, event, get_logger
+from helpers.routing import is_read_only, step_state
+
+# =========================
+# Speculative reads
+# =========================
+
+VERSION_TOOL = "state_version"
+
+log = get_logger(__name__)
+
+
+def speculation_candidates(plan, dag: CompactDAG) -> Set[int]:
+    """
+    Steps worth starting before their dependencies finish: read-only steps
+    whose arguments take nothing from other steps ($from), whose state keys
+    are known, and which wait for at least one step.
+    """
+    waiting = {dst for _, dst in dag.edges}
+    data_deps = from_dependencies(plan)
+    candidates = set()
+    for node in waiting:
+        step = plan[node]
+        if data_deps[node] or not is_read_only(step):
+            continue
+        state = step_state(step)
+        if state is not None and state["reads"]:
+            candidates.add(node)
+    return candidates
+
+
+class Speculator:
+    """
+    Runs idempotent reads early and keeps their results only if nothing they
+    read changed before their turn came.
+
+    start() records the version of every state key the step reads (the
+    servers' state_version tool), then executes it. validate(), called once
+    the step's DAG dependencies have finished, reads the versions again:
+    unchanged means no write the step had to wait for touched its state, so
+    the early result is the one it would have got; otherwise the step runs
+    again. Steps ordered after the read (write-after-read) wait for
+    validate(), so they can't be the reason for a change.
+    """
+
+    def __init__(self, sessions: Dict[str, object]):
+        self.sessions = sessions    # server -> session answering state_version
+        self.hits = 0
+        self.misses = 0
+        self._runs: Dict[int, asyncio.Task] = {}
+
+    async def versions(self, server: str, keys: Iterable[str]) -> Dict[str, object]:
+        result = await self.sessions[server].call_tool(VERSION_TOOL, arguments={"keys": sorted(keys)})
+        if result.isError:
+            raise RuntimeError(f"{VERSION_TOOL} failed on '{server}': {result.content}")
+        data = result.structuredContent
+        if data is None:
+            data = codec.loads(result.content[0].text)
+        return data["versions"]
+
+    async def available(self, servers: Iterable[str]) -> bool:
+        """
+        True if every server answers state_version (older databases lack the
+        state_versions table until helpers/init_db.py runs again).
+        """
+        for server in servers:
+            try:
+                await self.versions(server, [])
+            except Exception as e:
+                event(log, WARNING, "speculation.disabled",
+                      "[SPECULATION] disabled, no state versions on '%s': %s", server, e,
+                      server=server, error=str(e))
+                return False
+        return True
+
+    def start(self, node: int, step, run: Callable[[], Awaitable]):
+        server = step.get("server", "db")
+        keys = step_state(step)["reads"]
+
+        async def speculate():
+            before = await self.versions(server, keys)
+            return before, await run()
+
+        self._runs[node] = asyncio.create_task(speculate())
+
+    def speculating(self, node: int) -> bool:
+        return node in self._runs
+
+    async def validate(self, node: int, step, run: Callable[[], Awaitable]):
+        """
+        The early result if it is still valid, otherwise the result of a fresh run.
+        """
+        server = step.get("server", "db")
+        try:
+            before, result = await self._runs.pop(node)
+            valid = (
+                not getattr(result, "isError", False)
+                and await self.versions(server, before.keys()) == before
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            event(log, WARNING, "speculation.failed", "[SPECULATION] early run of node %s failed: %s",
+                  node, e, node=node, error=str(e))
+            valid = False
+
+        if valid:
+            self.hits += 1
+            return result
+        self.misses += 1
+        return await run()
+
+    async def cancel(self):
+        for task in self._runs.values():
+            task.cancel()
+        await asyncio.gather(*self._runs.values(), return_exceptions=True)
+        self._runs.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,65 @@
+from helpers import codec
+
+
+class IncrementalArrayParser:
+    """
+    Incrementally parse a JSON array of objects from text chunks.
+
+    feed() returns every top-level object that closed within the chunk, so
+    callers can act on each element before the rest of the array has arrived.
+    Text before the opening '[' (LLM chatter) is ignored.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.closed = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._buffer = []
+
+    def feed(self, chunk: str) -> list:
+        completed = []
+
+        for ch in chunk:
+            if self.closed:
+                break
+
+            if not self.started:
+                if ch == "[":
+                    self.started = True
+                continue
+
+            if self._depth == 0:
+                # Between elements: only '{', ',' , whitespace or the closing ']'
+                if ch == "{":
+                    self._depth = 1
+                    self._buffer = [ch]
+                elif ch == "]":
+                    self.closed = True
+                elif not (ch.isspace() or ch == ","):
+                    raise ValueError(f"Unexpected character {ch!r} between array elements")
+                continue
+
+            self._buffer.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.append(codec.loads("".join(self._buffer)))
+                    self._buffer = []
+
+        return completed
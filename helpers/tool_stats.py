@@ -0,0 +1,169 @@
+import os
+from dataclasses import replace
+from typing import Dict, List
+
+from helpers import codec
+from helpers.contracts import TOOL_CONTRACTS, ToolContract
+from helpers.event_log import WARNING, event, get_logger
+
+# =========================
+# Observed tool durations
+# =========================
+
+DEFAULT_STATS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".tool_stats.json"
+)
+DEFAULT_ALPHA = 0.3             # weight of the newest sample
+DEFAULT_COST_SECONDS = 0.05     # estimate for tools with neither samples nor a contract
+
+log = get_logger(__name__)
+
+
+def payload_size(output) -> int:
+    """
+    Approximate size in bytes of a tool or resource result: the text of
+    every content item (already serialized), otherwise structuredContent.
+    """
+    if output is None:
+        return 0
+    if isinstance(output, (str, bytes)):
+        return len(output)
+
+    for attr in ("content", "contents"):
+        items = getattr(output, attr, None)
+        if items:
+            return sum(payload_size(item) for item in items)
+
+    structured = getattr(output, "structuredContent", None)
+    if structured:
+        return len(codec.dumpb(structured, default=str))
+
+    text = getattr(output, "text", None)
+    if text is not None:
+        return len(text)
+
+    if isinstance(output, (list, tuple)):
+        return sum(payload_size(item) for item in output)
+    return len(codec.dumpb(output, default=str))
+
+
+class ToolStats:
+    """
+    Exponentially weighted moving averages of each tool's execution time and
+    result size, persisted as JSON so estimates survive between runs.
+
+    Tools without samples fall back to their ToolContract priors
+    (expected_latency_ms, payload_bytes).
+    """
+
+    def __init__(self, path: str = DEFAULT_STATS_PATH, alpha: float = DEFAULT_ALPHA):
+        self.path = path
+        self.alpha = alpha
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                self.stats = codec.loads(f.read())
+        except (OSError, ValueError) as e:
+            event(log, WARNING, "tool_stats.unreadable", "Ignoring unreadable tool stats %s: %s",
+                  self.path, e, path=self.path, error=str(e))
+            self.stats = {}
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(codec.dumpb(self.stats, indent=True, sort_keys=True))
+        os.replace(tmp_path, self.path)
+
+    def record(self, tool: str, seconds: float, payload_bytes: int = None):
+        entry = self.stats.get(tool)
+        if entry is None:
+            entry = self.stats[tool] = {"ewma": seconds, "count": 0, "total": 0.0}
+        else:
+            entry["ewma"] += self.alpha * (seconds - entry["ewma"])
+        entry["count"] += 1
+        entry["total"] = entry.get("total", 0.0) + seconds
+
+        if payload_bytes is not None:
+            if "payload_ewma" not in entry:
+                entry["payload_ewma"] = float(payload_bytes)
+            else:
+                entry["payload_ewma"] += self.alpha * (payload_bytes - entry["payload_ewma"])
+
+    def estimate(self, tool: str, default: float = None) -> float:
+        """
+        Expected execution time in seconds.
+        """
+        entry = self.stats.get(tool)
+        if entry:
+            return entry["ewma"]
+        contract = TOOL_CONTRACTS.get(tool)
+        if contract is not None:
+            return contract.expected_latency_ms / 1000
+        return DEFAULT_COST_SECONDS if default is None else default
+
+    def expected_payload(self, tool: str) -> int:
+        entry = self.stats.get(tool)
+        if entry and "payload_ewma" in entry:
+            return int(entry["payload_ewma"])
+        contract = TOOL_CONTRACTS.get(tool)
+        return contract.payload_bytes if contract is not None else 0
+
+    def contract(self, tool: str) -> ToolContract:
+        """
+        The tool's contract with its cost fields replaced by learned values.
+        """
+        return replace(
+            TOOL_CONTRACTS[tool],
+            expected_latency_ms=self.estimate(tool) * 1000,
+            payload_bytes=self.expected_payload(tool),
+        )
+
+    def report(self) -> List[Dict]:
+        """
+        One row per tool, sorted by total observed time (where plan time goes).
+        """
+        grand_total = sum(entry.get("total", 0.0) for entry in self.stats.values()) or 1.0
+        rows = []
+        for tool, entry in self.stats.items():
+            contract = TOOL_CONTRACTS.get(tool)
+            rows.append({
+                "tool": tool,
+                "resource_class": contract.resource_class if contract else "?",
+                "count": entry["count"],
+                "total_s": entry.get("total", 0.0),
+                "share": entry.get("total", 0.0) / grand_total,
+                "learned_ms": entry["ewma"] * 1000,
+                "prior_ms": contract.expected_latency_ms if contract else None,
+                "payload_bytes": self.expected_payload(tool),
+            })
+        rows.sort(key=lambda row: row["total_s"], reverse=True)
+        return rows
+
+    def format_report(self) -> str:
+        rows = self.report()
+        lines = [
+            f"{'tool':<18} {'class':<9} {'calls':>6} {'total s':>9} {'share':>6} "
+            f"{'learned ms':>11} {'prior ms':>9} {'payload B':>10}"
+        ]
+        by_class: Dict[str, float] = {}
+        for row in rows:
+            prior = f"{row['prior_ms']:.1f}" if row["prior_ms"] is not None else "-"
+            lines.append(
+                f"{row['tool']:<18} {row['resource_class']:<9} {row['count']:>6} "
+                f"{row['total_s']:>9.3f} {row['share']:>6.1%} {row['learned_ms']:>11.2f} "
+                f"{prior:>9} {row['payload_bytes']:>10}"
+            )
+            by_class[row["resource_class"]] = by_class.get(row["resource_class"], 0.0) + row["share"]
+
+        lines.append("")
+        lines.append("By resource class: " + ", ".join(
+            f"{name} {share:.1%}" for name, share in sorted(by_class.items(), key=lambda kv: -kv[1])
+        ))
+        return "\n".join(lines)
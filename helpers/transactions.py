@@ -0,0 +1,119 @@
+import heapq
+from typing import List
+
+from helpers.create_DAG import build_execution_dag, from_dependencies
+
+# =========================
+# Transactional grouping
+# =========================
+
+TRANSACTION_TOOL = "run_transaction"
+# Single-row write tools the db server's run_transaction accepts
+TRANSACTION_OPS = {"create_user", "update_user", "delete_user"}
+
+
+def can_join_transaction(step: dict, data_deps) -> bool:
+    """
+    A step can be grouped when it is a db write run_transaction supports and
+    its arguments are known when planning: the transaction runs server-side,
+    so nothing can be injected from other steps' results.
+    """
+    return (
+        step.get("type", "tool") == "tool"
+        and step.get("server", "db") == "db"
+        and step.get("tool") in TRANSACTION_OPS
+        and "members" not in step
+        and not step.get("$from")
+        and not data_deps
+    )
+
+
+def _transaction_group(plan, dag) -> List[int]:
+    """
+    The largest set of groupable steps that can run as one unit: a step joins
+    unless it is reachable from the group through a step outside it (merging
+    it would create a cycle). Plan order is a topological order, so one pass
+    is enough.
+    """
+    data_deps = from_dependencies(plan)
+    predecessors = [[] for _ in plan]
+    for src, dst in dag.edges:
+        predecessors[dst].append(src)
+
+    members = []
+    in_group = set()
+    after_group = set()     # steps outside the group that depend on it
+    for node in dag.nodes:
+        preds = predecessors[node]
+        if can_join_transaction(plan[node], data_deps[node]) and not any(
+            p in after_group for p in preds
+        ):
+            members.append(node)
+            in_group.add(node)
+        elif any(p in in_group or p in after_group for p in preds):
+            after_group.add(node)
+    return members
+
+
+def _contract(plan, dag, members: List[int]) -> list:
+    """
+    Replace `members` with one run_transaction step and reorder the plan so
+    every edge still points forward (lowest original position first).
+    """
+    first = members[0]
+    transaction = {
+        "id": f"txn_{plan[first]['id']}",
+        "type": "tool",
+        "server": "db",
+        "tool": TRANSACTION_TOOL,
+        "arguments": {
+            "operations": [
+                {"tool": plan[n]["tool"], "arguments": plan[n].get("arguments", {})}
+                for n in members
+            ]
+        },
+        "$from": [],
+        "members": [plan[n]["id"] for n in members],
+    }
+
+    in_group = set(members)
+    unit = {node: (first if node in in_group else node) for node in dag.nodes}
+    successors = {node: set() for node in unit.values()}
+    in_degree = {node: 0 for node in unit.values()}
+    for src, dst in dag.edges:
+        src, dst = unit[src], unit[dst]
+        if src != dst and dst not in successors[src]:
+            successors[src].add(dst)
+            in_degree[dst] += 1
+
+    ready = [node for node, degree in in_degree.items() if degree == 0]
+    heapq.heapify(ready)
+    grouped_plan = []
+    while ready:
+        node = heapq.heappop(ready)
+        grouped_plan.append(transaction if node == first else plan[node])
+        for succ in successors[node]:
+            in_degree[succ] -= 1
+            if in_degree[succ] == 0:
+                heapq.heappush(ready, succ)
+    return grouped_plan
+
+
+def group_transactions(plan: List[dict], dependencies="dataflow") -> List[dict]:
+    """
+    Planner pass: fold db writes into run_transaction steps, so each group
+    pays one commit and is applied entirely or not at all.
+
+    Groups are formed one after another until no two more steps can be
+    merged. Results are split back out per step id like batches
+    (split_batch_output). Plans without step ids are returned as is.
+    """
+    if not all("id" in step for step in plan):
+        return plan
+
+    while True:
+        dag = build_execution_dag(plan, verbose=False, dependencies=dependencies)
+        members = _transaction_group(plan, dag)
+        if len(members) < 2:
+            return plan
+        plan = _contract(plan, dag, members)
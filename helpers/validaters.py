@@ -1,11 +1,15 @@
 from helpers.contracts import TOOL_CONTRACTS
+from helpers.event_log import DEBUG, INFO, event, get_logger
+
+log = get_logger(__name__)
 
 def validate_step(step:dict):
     if "tool" not in step:
         raise ValueError(f"Missing 'tool' field: {step}")
     
     tool_name = step["tool"]
-    print(f"Validating:{tool_name} against the contract")
+    event(log, DEBUG, "plan.validate_step", "Validating:%s against the contract", tool_name,
+          tool=tool_name)
     if tool_name not in TOOL_CONTRACTS:
         raise ValueError(f"Unknown tool: {tool_name}")
     
@@ -51,5 +55,5 @@ def validate_plan(plan:list):
             raise ValueError(f"Step {i} is not an object")
     #for step in plan:
         validate_step(step)
-    print("------- Plan is Valid -----")    
+    event(log, INFO, "plan.valid", "------- Plan is Valid -----", steps=len(plan))
     return True
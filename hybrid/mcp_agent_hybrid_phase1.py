@@ -2,16 +2,18 @@
 #Goal:
 #Prove that llama can reliably output a valid plan.
 #source ~/venvs/py310/bin/activate
-import json
-import requests
-import time
 import asyncio
 #from hybrid.mcp_agent_hybrid_phase2a import validate_plan
+from helpers import codec
 from helpers.validaters import validate_plan
 from hybrid.mcp_agent_hybrid_phase2b import execute_plan  # import Phase 2 executor
 #from helpers.create_DAG import build_execution_dag
 #from helpers.create_layers import build_execution_layers
-from hybrid.mcp_agent_hybrid_phase2b_para import execute_plan_parallel_safe
+from hybrid.parallel_mcp_agent import execute_plan_parallel_safe
+from helpers.plan_cache import PlanCache
+from helpers.streaming_json import IncrementalArrayParser
+from helpers.langgraph_validator import validate_step
+from helpers.llm_client import AsyncLLMClient
 
 #from contracts import TOOL_CONTRACTS
 
@@ -27,55 +29,89 @@ def extract_json_array(raw: str):
         raise ValueError(f"No JSON array found in LLM output:\n{raw}")
 
     json_text = raw[start:end + 1]
-    return json.loads(json_text)
+    return codec.loads(json_text)
 
 
-def ask_llama_plan(prompt: str, max_retries: int = 3,token_size: int = 512):
+async def ask_llama_plan(prompt: str, max_retries: int = 3,token_size: int = 512,
+                         cache: PlanCache = None, llm: AsyncLLMClient = None):
+    """
+    cache: optional PlanCache; a hit skips the LLM call entirely.
+    Plans are stored only if they pass validate_plan.
+    llm: shared AsyncLLMClient; a temporary one is used when omitted.
+    """
+    if llm is None:
+        async with AsyncLLMClient() as llm:
+            return await _ask_llama_plan(prompt, max_retries, token_size, cache, llm)
+    return await _ask_llama_plan(prompt, max_retries, token_size, cache, llm)
+
+
+async def _ask_llama_plan(prompt: str, max_retries: int, token_size: int,
+                          cache: PlanCache, llm: AsyncLLMClient):
     last_error = None
+    options = {"num_predict": token_size}
+    if cache is not None:
+        # Keyed on the model and options the request is actually sent with
+        cache_key = cache.make_key(prompt, llm.request_options(options))
+        cached = cache.get(cache_key)
+        if cached is not None:
+            print(f">>> LLM PLAN CACHE HIT {cache.stats()}")
+            return cached
+
     print(f"LLM Prompt :\m {prompt}") 
     for attempt in range(1, max_retries + 1):
         try:
             print(f">>> LLM CALL STARTED (attempt {attempt}, tokem size {token_size})")
-
-            response = requests.post(
-                "http://localhost:11434/api/generate",
-                json={
-                    "model": "llama3",
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.0,
-                        "num_predict": token_size
-                    }
-                },
-                timeout=600
-            )
-
-            response.raise_for_status()
-            """
-            text = response.json()["response"].strip()
-
-            if not is_json_complete(text):
-                raise ValueError("Incomplete JSON")
-
-            plan = json.loads(text)
-            #print(">>> LLM PLAN RECEIVED")
-            #print(json.dumps(plan, indent=2))
-            return plan
-            """
-            response.raise_for_status()
-            raw = response.json()["response"]
+            # Transport errors are retried inside the client; here we retry bad output
+            raw = await llm.generate(prompt, options)
             plan = extract_json_array(raw)
-            print("LLM Plan (JSON):", json.dumps(plan, indent=2))
+            print("LLM Plan (JSON):", codec.dumps(plan, indent=True))
+            if cache is not None:
+                cache.put(cache_key, plan, validate_plan)
             return plan 
         
-        except Exception as e:
+        except ValueError as e:
             last_error = str(e)
             print(f"LLM call failed (attempt {attempt}): {last_error}")
-            time.sleep(2 * attempt)
+            await asyncio.sleep(llm.backoff(attempt))
 
     raise RuntimeError(f"LLM failed after {max_retries} attempts: {last_error}")
 
+# ----------------- Streaming LLM planning -----------------
+async def stream_llama_plan(prompt: str, token_size: int = 512, llm: AsyncLLMClient = None):
+    """
+    Stream the plan from Ollama and yield each step as soon as its JSON
+    object closes. Each step is checked with validate_step before it is yielded.
+    """
+    if llm is None:
+        async with AsyncLLMClient() as llm:
+            async for step in stream_llama_plan(prompt, token_size, llm):
+                yield step
+        return
+
+    parser = IncrementalArrayParser()
+    seen_ids = set()
+
+    async for chunk in llm.stream(prompt, {"num_predict": token_size}):
+        for step in parser.feed(chunk):
+            validate_step(step, seen_ids)
+            print(f">>> LLM STEP READY: {step['id']}")
+            yield step
+
+    if not parser.closed:
+        raise ValueError("LLM stream ended before the JSON plan array was closed")
+
+
+async def plan_and_execute_streaming(prompt: str, token_size: int = 1024,
+                                     llm: AsyncLLMClient = None, pool=None):
+    """
+    Overlap plan generation with execution: every validated step goes to the
+    dataflow executor while the LLM is still producing the rest of the plan.
+    Pass a shared MCPServerPool as `pool` to skip server start-up entirely.
+    """
+    from longraph.longraph_agent import execute_plan_streaming
+    return await execute_plan_streaming(stream_llama_plan(prompt, token_size, llm), pool=pool)
+
+
 # ----------------- Run -----------------
 prompt= """
 You are an assistant that and that can call tools via MCP..
@@ -111,9 +147,9 @@ async def main():
     
     print("-------------  Phase 1 - Skeleton Agent (No MCP Yet) -----------")
     print("Prove that llama can reliably output a valid plan.")
-    plan = ask_llama_plan(prompt)
+    plan = await ask_llama_plan(prompt, cache=PlanCache())
     print("\nFINAL PLAN:")
-    print(json.dumps(plan, indent=2))
+    print(codec.dumps(plan, indent=True))
     
     print('-------------- Phase 2 - LLM generated plan validation ---------')
     print("We validate the generated plan against the defined contract")
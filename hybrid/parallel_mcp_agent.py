@@ -1,13 +1,23 @@
 import asyncio
-import json
 import os
+import time
+from helpers import codec
+from helpers.blob_store import BlobStore
 from helpers.contracts import TOOL_CONTRACTS
 from helpers.create_DAG import build_execution_dag
 from helpers.create_layers import build_execution_layers
-from mcp.client.stdio import stdio_client, StdioServerParameters
-from mcp.client.session import ClientSession
+from helpers.event_log import DEBUG, ERROR, INFO, WARNING, enabled, event, get_logger, lazy
+from helpers.server_pool import borrow_pool
+from helpers.pagination import pages_to_blob, user_pages
+from helpers.routing import ReplicaRouter
+from helpers.scheduler import CriticalPathScheduler
+from helpers.speculation import Speculator, speculation_candidates
+from helpers.tool_stats import ToolStats, payload_size
+from mcp.client.stdio import StdioServerParameters
+from mcp.types import CallToolResult
 from collections import defaultdict
-import networkx as nx
+
+log = get_logger(__name__)
 
 # ----------------- Database server parameters -----------------
 DB_PARAMS = StdioServerParameters(
@@ -21,10 +31,9 @@ FILE_PARAMS = StdioServerParameters(
     command="python3",
     args=["servers/file_server.py"]
 )
-# ------------------------------------------------------------
 
-# Global lock: protects MCP ClientSession write stream
-tool_call_lock = asyncio.Lock()
+SERVER_PARAMS = {"db": DB_PARAMS, "file": FILE_PARAMS}
+# ------------------------------------------------------------
 
 # ANSI color codes for terminal
 COLOR_RESET = "\033[0m"
@@ -50,9 +59,37 @@ def get_session_for_step(step, db_session, file_session):
 # ------------------------------------------------------------
 # Execute a single step (tool/resource)
 # ------------------------------------------------------------
-async def execute_step(step, db_session, file_session, max_retries=3):
+async def execute_paged_list(step, session, page_size, stream_pages, blob_store=None):
+    """
+    Run list_users page by page. With a blob store each page is written to
+    it as it arrives and the result is the blob ref; otherwise the pages
+    are folded into one structured result.
+    """
+    filters = {
+        k: v for k, v in step.get("arguments", {}).items()
+        if k in ("name_filter", "email_filter", "name_prefix")
+    }
+    pages = user_pages(session, page_size, stream_pages, **filters)
+    if blob_store is not None:
+        ref = await pages_to_blob(pages, blob_store)
+        return CallToolResult(content=[], structuredContent=ref)
+    rows = []
+    async for page in pages:
+        rows.extend(page)
+    return CallToolResult(content=[], structuredContent={"result": rows})
+
+
+async def execute_step(step, db_session, file_session, limiter, max_retries=3,
+                       page_size=None, stream_pages=False, router=None, stats=None,
+                       result_cache=None, blob_store=None):
     """
     Executes a single step (tool or resource) with optional retry.
+    Requests to the same server run concurrently up to the limiter's cap.
+    With a router, the step runs on the replica the router picks.
+    With stats, the successful attempt's duration (queueing excluded) and
+    result size are recorded. With result_cache, read-only steps are served
+    from it and every other step invalidates the state keys it writes.
+    With blob_store, paged list_users results are written to it page by page.
     """
     def normalize_file_uri(path: str) -> str:
         path = path.rstrip("/")
@@ -60,46 +97,90 @@ async def execute_step(step, db_session, file_session, max_retries=3):
             path = path[len("file://"):]
             parts = path.split("/")
             path = parts[-1]
-            print(f"=============== file://{path} ===================")
+            event(log, DEBUG, "resource.uri", "=============== file://%s ===================", path,
+                  uri=f"file://{path}")
         return f"file://{path}"
 
     step_type = step.get("type", "tool")
     tool_name = step["tool"]
 
-    session = get_session_for_step(step, db_session, file_session)
+    if router is not None:
+        server, session = await router.session_for(step)
+    else:
+        server = step.get("server", "db")
+        session = get_session_for_step(step, db_session, file_session)
 
     if step_type == "resource":
         max_retries = 1
 
-    attempt = 0
-    while True:
-        attempt += 1
-        try:
-            async with tool_call_lock:
-                if step_type == "tool":
-                    result = await session.call_tool(
-                        tool_name,
-                        arguments=step.get("arguments", {})
-                    )
-                elif step_type == "resource":
-                    result = await session.read_resource(
-                        normalize_file_uri(step["arguments"]["uri"])
-                    )
-                    print(f"-----------File Content from {step['arguments']['uri']}---------")
-                    for resource in result.contents:
-                        data = json.loads(resource.text)
-                        print(json.dumps(data, indent=2))
-                else:
-                    raise ValueError(f"Unknown step type: {step_type}")
-
-            return result  # Must return resolved result
-
-        except Exception as e:
-            if step_type == "tool" and attempt < max_retries:
-                print(f"[RETRY] {tool_name} ({attempt}) due to {e}")
-                await asyncio.sleep(0.1)
-                continue
-            raise
+    args = step.get("arguments", {})
+    paged = (
+        page_size is not None
+        and tool_name == "list_users"
+        and "limit" not in args
+        and "after_id" not in args
+    )
+
+    async def run():
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                async with limiter.slot(server):
+                    started = time.perf_counter()
+                    if step_type == "tool" and paged:
+                        result = await execute_paged_list(step, session, page_size, stream_pages,
+                                                          blob_store)
+                    elif step_type == "tool":
+                        result = await session.call_tool(
+                            tool_name,
+                            arguments=args
+                        )
+                    elif step_type == "resource":
+                        result = await session.read_resource(
+                            normalize_file_uri(args["uri"])
+                        )
+                        # Decoding and re-indenting the content is only worth it when shown
+                        if enabled(log, DEBUG):
+                            for resource in result.contents:
+                                event(log, DEBUG, "resource.content",
+                                      "-----------File Content from %s---------\n%s", args["uri"],
+                                      codec.dumps(codec.loads(resource.text), indent=True),
+                                      uri=args["uri"])
+                    else:
+                        raise ValueError(f"Unknown step type: {step_type}")
+
+                if stats is not None:
+                    stats.record(tool_name, time.perf_counter() - started, payload_size(result))
+                return result  # Must return resolved result
+
+            except Exception as e:
+                if step_type == "tool" and attempt < max_retries:
+                    event(log, WARNING, "step.retry", "[RETRY] %s (%d) due to %s",
+                          tool_name, attempt, e, tool=tool_name, attempt=attempt, error=str(e))
+                    await asyncio.sleep(0.1)
+                    continue
+                raise
+
+    if result_cache is None:
+        return await run()
+
+    # Read-only steps may be answered from the cache; writes invalidate it
+    reads = result_cache.reads_of(step)
+    if reads is not None:
+        return await result_cache.fetch(
+            # Keyed apart from longraph, which caches content rather than results
+            result_cache.make_key(step, args, ("hybrid", paged)),
+            reads,
+            run,
+            store_if=lambda result: not getattr(result, "isError", False),
+        )
+
+    try:
+        return await run()
+    finally:
+        # Even a failed write may have changed state
+        result_cache.invalidate(result_cache.writes_of(step))
 
 
 # ------------------------------------------------------------
@@ -116,82 +197,164 @@ def colorize_node(node_idx, step):
 
 
 # ------------------------------------------------------------
-# Execute the full plan with DAG-level fairness
+# Execute the full plan, most critical ready nodes first
 # ------------------------------------------------------------
-async def execute_plan_parallel_safe(plan):
-    print("------------ Building DAG --------")
-    dag = build_execution_dag(plan)
+async def execute_plan_parallel_safe(plan, max_in_flight=None, page_size=None, stream_pages=False,
+                                     pool=None, stats=None, result_cache=None,
+                                     dependencies="dataflow", speculate=False,
+                                     blob_store=None, fold_pages=False):
+    """
+    Ready nodes are dispatched by critical-path rank: the expected duration of
+    the longest path from the node to the end of the plan, with durations
+    learned from earlier runs (helpers.tool_stats).
+
+    pool:          warm helpers.server_pool.MCPServerPool shared across plans;
+                   without one, servers are spawned for this plan only
+    max_in_flight: optional {server: cap} overriding helpers.concurrency.MAX_IN_FLIGHT
+                   (only used for the per-plan pool, a shared pool owns its limiter)
+    page_size:     fetch list_users in keyset pages of this size; pages are
+                   written to blob_store as they arrive (a default BlobStore()
+                   when none is given) and the step's result is the blob ref
+    stream_pages:  receive those pages as stream_users progress notifications
+    fold_pages:    return paged results as one in-memory list instead
+    stats:         shared ToolStats; by default loaded from and saved to .tool_stats.json
+    result_cache:  helpers.result_cache.ResultCache; share one across plans to
+                   reuse reads between them
+    dependencies:  "dataflow" orders steps by $from and contracts only,
+                   "conservative" also serializes file steps after DB steps
+    speculate:     start independent read-only steps right away and keep their
+                   results if the state they read is unchanged when their
+                   dependencies finish (helpers.speculation)
+    """
+    own_stats = stats is None
+    if own_stats:
+        stats = ToolStats()
+    if page_size is not None and blob_store is None and not fold_pages:
+        blob_store = BlobStore()
 
-    print("------------ Creating execution Layers (for reference) --------")
+    event(log, DEBUG, "dag.build", "------------ Building DAG --------", steps=len(plan))
+    dag = build_execution_dag(plan, dependencies=dependencies)
+
+    event(log, DEBUG, "dag.layers.build", "------------ Creating execution Layers (for reference) --------")
     layers = build_execution_layers(dag)
 
-    async with stdio_client(DB_PARAMS) as (db_r, db_w), \
-               stdio_client(FILE_PARAMS) as (file_r, file_w):
-
-        async with ClientSession(db_r, db_w) as db_session, \
-                   ClientSession(file_r, file_w) as file_session:
-
-            # Safe pretty-print metadata
-            db_metadata = await db_session.initialize()
-            file_metadata = await file_session.initialize()
-            print("\nDB Server Metadata:")
-            print(json.dumps(vars(db_metadata), indent=2, default=str))
-            print("\nFile Server Metadata:")
-            print(json.dumps(vars(file_metadata), indent=2, default=str))
-
-            # -----------------------------
-            # DAG-level execution with live logging
-            # -----------------------------
-            in_degree = {n: dag.in_degree(n) for n in dag.nodes}
-            ready = [n for n, deg in in_degree.items() if deg == 0]
-            running_tasks = {}
-            results = [None] * len(plan)
-            execution_error = None
-            layer_counter = 0
-
-            while ready or running_tasks:
-                if ready:
-                    ready_str = ", ".join(colorize_node(n, plan[n]) for n in ready)
-                    print(f"\n[Layer {layer_counter}] Ready to run nodes: {ready_str}")
-                    layer_counter += 1
-
-                for node in ready:
-                    step_info = colorize_node(node, plan[node])
-                    print(f"--> Launching node {step_info}")
-                    task = asyncio.create_task(execute_step(plan[node], db_session, file_session))
-                    running_tasks[task] = node
-                ready = []
-
-                if not running_tasks:
+    async with borrow_pool(pool, SERVER_PARAMS, max_in_flight) as pool:
+        db_session = await pool.session("db")
+        file_session = await pool.session("file")
+
+        # Safe pretty-print metadata
+        if enabled(log, DEBUG):
+            for name, label in (("db", "DB"), ("file", "File")):
+                metadata = vars(pool.servers[name].init_result)
+                event(log, DEBUG, "server.metadata", "\n%s Server Metadata:\n%s", label,
+                      codec.dumps(metadata, indent=True, default=str),
+                      server=name, metadata=metadata)
+
+        # -----------------------------
+        # DAG-level execution with live logging
+        # -----------------------------
+        limiter = pool.limiter
+        router = ReplicaRouter(pool)
+        # Servers with replicas can take one cap's worth of requests per replica
+        capacity = {
+            name: sum(limiter.limit_for(replica) for replica in pool.replicas(name))
+            for name in SERVER_PARAMS
+        }
+        costs = [stats.estimate(step["tool"]) for step in plan]
+        scheduler = CriticalPathScheduler(dag, plan, costs, capacity)
+        running_tasks = {}
+        results = [None] * len(plan)
+        execution_error = None
+        wave_counter = 0
+
+        def run_node(node, cache=result_cache):
+            return lambda: execute_step(
+                plan[node], db_session, file_session, limiter,
+                page_size=page_size, stream_pages=stream_pages, router=router,
+                stats=stats, result_cache=cache, blob_store=blob_store
+            )
+
+        speculator = None
+        if speculate:
+            candidates = speculation_candidates(plan, dag)
+            speculator = Speculator({"db": db_session, "file": file_session})
+            servers = {plan[node].get("server", "db") for node in candidates}
+            if candidates and await speculator.available(servers):
+                event(log, INFO, "speculation.start", "[SPECULATION] Starting reads early: %s",
+                      sorted(candidates), nodes=sorted(candidates))
+                for node in sorted(candidates, key=lambda n: -scheduler.ranks[n]):
+                    # The early run bypasses the result cache: it may be thrown away
+                    speculator.start(node, plan[node], run_node(node, cache=None))
+
+        while scheduler.has_ready() or running_tasks:
+            launch = scheduler.dispatch()
+            if launch:
+                if enabled(log, INFO):
+                    launch_str = ", ".join(
+                        f"{colorize_node(n, plan[n])} (rank {scheduler.ranks[n]:.3f}s)" for n in launch
+                    )
+                    event(log, INFO, "wave.dispatch", "\n[Wave %d] Dispatching by critical path: %s",
+                          wave_counter, launch_str, wave=wave_counter, nodes=launch,
+                          ranks=[scheduler.ranks[n] for n in launch])
+                wave_counter += 1
+
+            for node in launch:
+                step_info = lazy(colorize_node, node, plan[node])
+                if speculator is not None and speculator.speculating(node):
+                    event(log, INFO, "node.validate", "--> Validating early read of node %s",
+                          step_info, node=node, tool=plan[node]["tool"])
+                    task = asyncio.create_task(speculator.validate(node, plan[node], run_node(node)))
+                else:
+                    event(log, INFO, "node.launch", "--> Launching node %s",
+                          step_info, node=node, tool=plan[node]["tool"])
+                    task = asyncio.create_task(run_node(node)())
+                running_tasks[task] = node
+
+            if not running_tasks:
+                break
+
+            done, _ = await asyncio.wait(running_tasks.keys(), return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                node = running_tasks.pop(task)
+                step_info = lazy(colorize_node, node, plan[node])
+                try:
+                    results[node] = task.result()
+                    event(log, INFO, "node.complete", "<-- Completed node %s",
+                          step_info, node=node, tool=plan[node]["tool"])
+                except Exception as e:
+                    event(log, ERROR, "node.error", "[ERROR] Node %s failed: %s",
+                          step_info, e, node=node, tool=plan[node]["tool"], error=str(e))
+                    execution_error = e
                     break
 
-                done, _ = await asyncio.wait(running_tasks.keys(), return_when=asyncio.FIRST_COMPLETED)
-
-                for task in done:
-                    node = running_tasks.pop(task)
-                    step_info = colorize_node(node, plan[node])
-                    try:
-                        results[node] = task.result()
-                        print(f"<-- Completed node {step_info}")
-                    except Exception as e:
-                        print(f"[ERROR] Node {step_info} failed: {e}")
-                        execution_error = e
-                        break
-
-                    for succ in dag.successors(node):
-                        in_degree[succ] -= 1
-                        if in_degree[succ] == 0:
-                            ready.append(succ)
-
-                running_nodes = [colorize_node(n, plan[n]) for n in running_tasks.values()]
-                ready_nodes = [colorize_node(n, plan[n]) for n in ready]
-                print(f"Current running tasks: {running_nodes}")
-                print(f"Nodes ready for next iteration: {ready_nodes}")
-
-                if execution_error:
-                    break
+                scheduler.complete(node)
 
-            if execution_error:
-                raise execution_error
+            if enabled(log, DEBUG):
+                running = list(running_tasks.values())
+                waiting = list(scheduler.waiting())
+                event(log, DEBUG, "scheduler.state",
+                      "Current running tasks: [%s]\nNodes ready, waiting for capacity: [%s]",
+                      ", ".join(colorize_node(n, plan[n]) for n in running),
+                      ", ".join(colorize_node(n, plan[n]) for n in waiting),
+                      running=running, waiting=waiting)
 
-            return results
+            if execution_error:
+                break
+
+        if own_stats:
+            stats.save()
+        if speculator is not None:
+            event(log, INFO, "speculation.stats", "[SPECULATION] %s",
+                  speculator.stats(), **speculator.stats())
+
+        if execution_error:
+            # A shared pool outlives this plan, so stop our own in-flight calls
+            for task in running_tasks:
+                task.cancel()
+            await asyncio.gather(*running_tasks, return_exceptions=True)
+            if speculator is not None:
+                await speculator.cancel()
+            raise execution_error
+
+        return results
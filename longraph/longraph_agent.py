@@ -1,10 +1,21 @@
 import asyncio
-import json
+import time
+from contextlib import asynccontextmanager
 from collections import defaultdict
-from helpers.create_DAG import build_execution_dag
+from helpers.create_DAG import StreamingDependencies, build_execution_dag
 from helpers.create_layers import build_execution_layers
-from mcp.client.stdio import stdio_client, StdioServerParameters
-from mcp.client.session import ClientSession
+from helpers.server_pool import borrow_pool
+from helpers.batching import merge_sibling_batches, split_batch_output
+from helpers.transactions import group_transactions
+from helpers.pagination import pages_to_blob, user_pages
+from helpers.routing import ReplicaRouter
+from helpers.tool_stats import ToolStats, payload_size
+from helpers.normalize_results import tool_payload
+from helpers import codec
+from helpers.blob_store import BlobStore, is_blob_ref, materialize, pass_by_handle
+from helpers.event_log import INFO, event, get_logger
+from helpers.file_transfer import read_file_to_blob
+from mcp.client.stdio import StdioServerParameters
 
 # ----------------- Server Parameters -----------------
 
@@ -20,9 +31,13 @@ FILE_PARAMS = StdioServerParameters(
     args=["servers/file_server.py"]
 )
 
-# ----------------------------------------------------
+SERVER_PARAMS = {"db": DB_PARAMS, "file": FILE_PARAMS}
+
+log = get_logger(__name__)
 
-tool_call_lock = asyncio.Lock()
+# "dataflow": start each step when its own dependencies finish
+# "layered":  run build_execution_layers layers one after another
+EXECUTION_MODES = ("dataflow", "layered")
 
 # ----------------------------------------------------
 # Helpers
@@ -37,6 +52,28 @@ def get_session_for_step(step, db_session, file_session):
     raise ValueError(f"Unknown server '{server}'")
 
 
+@asynccontextmanager
+async def recording(stats, save):
+    """
+    Persist learned tool costs when the run ends, failed runs included.
+    """
+    try:
+        yield stats
+    finally:
+        if save:
+            stats.save()
+
+
+def from_refs(step):
+    """
+    Normalize a step's top-level $from into a list of step ids.
+    """
+    refs = step.get("$from", [])
+    if isinstance(refs, str):
+        return [refs] if refs else []
+    return list(refs)
+
+
 def resolve_arguments(value, state):
     """
     Recursively resolve arguments. 
@@ -59,37 +96,28 @@ def resolve_arguments(value, state):
         return [resolve_arguments(v, state) for v in value]
     return value
 
-import json
-from mcp.types import TextContent
-
 def normalize_output(values):
     """
-    Normalize MCP tool outputs into plain Python data.
+    Combine the outputs of a step's $from dependencies into one value.
+
+    Outputs are kept decoded in execution_state (tool_payload), so they are
+    passed on by reference, never parsed or dumped again on the way.
 
     Input:
-        values: List[List[Content]]  (fan-in of step outputs)
+        values: list of step outputs  (fan-in)
 
     Output:
         - dict              (single JSON object)
-        - list[dict]        (fan-in)
+        - list[dict]        (fan-in, list outputs are flattened)
         - str / list[str]   (fallback)
     """
     normalized = []
 
     for output in values:
-        if not isinstance(output, list):
-            raise TypeError(f"Expected list of Content, got {type(output)}")
-
-        for item in output:
-            if isinstance(item, TextContent):
-                text = item.text.strip()
-                try:
-                    normalized.append(json.loads(text))
-                except json.JSONDecodeError:
-                    normalized.append(text)
-            else:
-                # New: future-proof for other MCP content types
-                normalized.append(item)
+        if isinstance(output, list):
+            normalized.extend(output)
+        else:
+            normalized.append(output)
 
     # Collapse single value
     if len(normalized) == 1:
@@ -98,19 +126,61 @@ def normalize_output(values):
     return normalized
 
 
+def normalize_blob_output(values, blob_store):
+    """
+    normalize_output for outputs that may be blob refs, giving the same
+    content as with every value inline. A ref is passed on as it is only
+    when it is the single output, holds encoded JSON (not a raw file) and
+    is not a one-item list, which normalize_output would collapse.
+    Otherwise refs are read back and normalized like any other output.
+    """
+    if len(values) == 1 and is_blob_ref(values[0]):
+        ref = values[0]
+        if not ref.get("raw") and ref.get("count") != 1:
+            return ref
+    return normalize_output([materialize(v, blob_store) for v in values])
+
+
 # ----------------------------------------------------
 # Step Executor (single step only)
 # ----------------------------------------------------
 
-async def execute_step(step, db_session, file_session, execution_state):
+def is_paged_list(step, resolved_args, page_size):
+    """
+    list_users is paged by the executor when a page size is configured
+    and the step did not ask for a specific page itself.
+    """
+    return (
+        page_size is not None
+        and step["tool"] == "list_users"
+        and "limit" not in resolved_args
+        and "after_id" not in resolved_args
+    )
+
+
+async def execute_step(step, db_session, file_session, execution_state, limiter,
+                       page_size=None, stream_pages=False, router=None, stats=None,
+                       result_cache=None, blob_store=None):
     step_id = step["id"]
     tool_name = step["tool"]
     step_type = step.get("type", "tool")
 
-    session = get_session_for_step(step, db_session, file_session)
+    # Replicated servers: the router picks the writer or a read replica
+    if router is not None:
+        server, session = await router.session_for(step)
+    else:
+        server = step.get("server", "db")
+        session = get_session_for_step(step, db_session, file_session)
 
     # New: Resolve all $from references or nested arguments
     resolved_args = resolve_arguments(step.get("arguments", {}), execution_state)
+    # Shared blob store: user lists stay on disk, later steps get a handle
+    if (blob_store is not None and step_type == "tool" and tool_name == "list_users"
+            and not is_paged_list(step, resolved_args, page_size)):
+        resolved_args["as_blob"] = True
+    cache_reads = result_cache.reads_of(step) if result_cache is not None else None
+    # Cache key: declared arguments, before $from outputs are injected as content
+    key_args = dict(resolved_args) if cache_reads is not None else None
     #print(f"Resolved arguments: {resolved_args}")
     # inject step-level $from outputs
     if step_type == "tool":
@@ -126,28 +196,96 @@ async def execute_step(step, db_session, file_session, execution_state):
             #print(f"xxxxx {execution_state[ref]}")
                values.append(execution_state[ref])
             # Convention: write into `content`
-            normalized_content = normalize_output(values)
+            if blob_store is not None:
+                normalized_content = normalize_blob_output(values, blob_store)
+            else:
+                normalized_content = normalize_output(values)
             #print(f"Normalized Content: {normalized_content}")
             #resolved_args["content"] = values[0] if len(values) == 1 else values
             resolved_args["content"] = normalized_content 
+
+    if blob_store is not None and step_type == "tool":
+        resolved_args = pass_by_handle(tool_name, resolved_args, blob_store)
     
-    async with tool_call_lock:
-        if step_type == "tool":
-            #print(f"Calling tool {tool_name} with {resolved_args}")
-            result = await session.call_tool(tool_name, resolved_args)
-            #print(f"Result: {result}")
-            output = result.content
+    tool_error = False
+
+    async def run():
+        nonlocal tool_error
+        # Requests share the session; only the per-server cap is enforced
+        async with limiter.slot(server):
+            started = time.perf_counter()
+            raw = None
+            if step_type == "tool" and is_paged_list(step, resolved_args, page_size):
+                # Consume list_users page by page
+                filters = {
+                    k: v for k, v in resolved_args.items()
+                    if k in ("name_filter", "email_filter", "name_prefix")
+                }
+                pages = user_pages(session, page_size, stream_pages, **filters)
+                if blob_store is not None:
+                    # Each page goes to disk as it arrives; later steps get the handle
+                    output = await pages_to_blob(pages, blob_store)
+                else:
+                    # fold_pages: rows are kept as one list of plain dicts
+                    output = []
+                    async for page in pages:
+                        output.extend(page)
+
+            elif step_type == "tool":
+                #print(f"Calling tool {tool_name} with {resolved_args}")
+                raw = await session.call_tool(tool_name, resolved_args)
+                #print(f"Result: {raw}")
+                # Decoded once here; later steps get this value by reference
+                output = tool_payload(raw)
+                tool_error = bool(raw.isError)
             
-        elif step_type == "resource":
-            resource = await session.read_resource(resolved_args["uri"])
-            #print(f"Resource: {resource}")
-            output = json.loads(resource.contents[0].text)
-        else:
-            raise ValueError(f"Unknown step type '{step_type}'")
+            elif step_type == "resource" and blob_store is not None:
+                # Streamed in ranged chunks; later steps get the blob handle
+                output = await read_file_to_blob(session, resolved_args["uri"], blob_store)
+
+            elif step_type == "resource":
+                raw = await session.read_resource(resolved_args["uri"])
+                #print(f"Resource: {raw}")
+                output = codec.loads(raw.contents[0].text)
+            else:
+                raise ValueError(f"Unknown step type '{step_type}'")
+
+        # Learned cost model: duration inside the slot and result size
+        # (measured on the raw result's text, which is already serialized)
+        if stats is not None:
+            stats.record(tool_name, time.perf_counter() - started,
+                         payload_size(raw if raw is not None else output))
+        return output
+
+    if result_cache is None:
+        output = await run()
+    elif cache_reads is not None:
+        # Read-only: served from the cache or shared with an identical call in flight
+        output = await result_cache.fetch(
+            result_cache.make_key(
+                step, key_args, ("longraph", is_paged_list(step, resolved_args, page_size))
+            ),
+            cache_reads,
+            run,
+            store_if=lambda output: not tool_error,
+        )
+    else:
+        try:
+            output = await run()
+        finally:
+            # Even a failed write may have changed state
+            result_cache.invalidate(result_cache.writes_of(step))
 
     # New: Always store output keyed by step id in execution_state
     execution_state[step_id] = output
 
+    # Batch and transaction steps hand each merged step its own slice of the output
+    if "members" in step:
+        if tool_error:
+            # Both run as one transaction: nothing was applied
+            raise RuntimeError(f"Step '{step_id}' failed, none of {step['members']} applied: {output}")
+        execution_state.update(split_batch_output(step, output))
+
     # Keep existing 'produces' support
     if "produces" in step:
         execution_state[step["produces"]] = output
@@ -158,13 +296,17 @@ async def execute_step(step, db_session, file_session, execution_state):
 # Layer Executor
 # ----------------------------------------------------
 
-async def execute_layer(layer, plan, db_session, file_session, execution_state):
+async def execute_layer(layer, plan, db_session, file_session, execution_state, limiter,
+                        page_size=None, stream_pages=False, router=None, stats=None,
+                        result_cache=None, blob_store=None):
     tasks = {}
     for node in layer:
         step = plan[node]
-        print(f" ---- Processing Node : {node} -- Task {step} -----" )
+        event(log, INFO, "node.launch", " ---- Processing Node : %s -- Task %s -----", node, step,
+              node=node, step=step["id"], tool=step["tool"])
         task = asyncio.create_task(
-            execute_step(step, db_session, file_session, execution_state)
+            execute_step(step, db_session, file_session, execution_state, limiter,
+                         page_size, stream_pages, router, stats, result_cache, blob_store)
         )
         tasks[task] = step["id"]
 
@@ -177,31 +319,204 @@ async def execute_layer(layer, plan, db_session, file_session, execution_state):
 # Main Plan Executor (DAG-safe)
 # ----------------------------------------------------
 
-async def execute_plan_parallel_safe(plan):
-    # New: DAG and layers are fully based on $from references
-    dag = build_execution_dag(plan)
-    layers = build_execution_layers(dag)
+async def execute_plan_parallel_safe(plan, max_in_flight=None, batch=False,
+                                     page_size=None, stream_pages=False, pool=None,
+                                     mode="dataflow", stats=None, result_cache=None,
+                                     dependencies="dataflow", transactions=False,
+                                     blob_store=None, fold_pages=False):
+    """
+    mode:         "dataflow" starts each step as soon as its own dependencies
+                  finish; "layered" awaits whole execution layers in turn
+    dependencies: "dataflow" orders steps by $from and contracts only,
+                  "conservative" also serializes file steps after DB steps
+                  (helpers.create_DAG.DEPENDENCY_MODES)
+    transactions: group db writes into run_transaction steps, one commit
+                  each, applied entirely or not at all (helpers.transactions)
+    pool:         warm helpers.server_pool.MCPServerPool shared across plans;
+                  without one, servers are spawned for this plan only
+    page_size:    fetch list_users in keyset pages of this size; pages are
+                  written to the blob store as they arrive (a default
+                  BlobStore() when none is given)
+    stream_pages: receive those pages as stream_users progress notifications
+    fold_pages:   keep paged results as one in-memory list instead
+    stats:        shared ToolStats; by default loaded from and saved to .tool_stats.json
+    result_cache: helpers.result_cache.ResultCache; share one across plans to
+                  reuse reads between them
+    blob_store:   helpers.blob_store.BlobStore; large payloads are passed
+                  between steps as blob:// handles instead of inline JSON,
+                  and read_file resources are streamed into it in chunks
+    """
+    if mode not in EXECUTION_MODES:
+        raise ValueError(f"Unknown execution mode '{mode}', expected one of {EXECUTION_MODES}")
+    if page_size is not None and blob_store is None and not fold_pages:
+        blob_store = BlobStore()
 
-    execution_state: dict[str, any] = {}
+    # New: DAG and layers are based on $from references and tool contracts
+    dag = build_execution_dag(plan, dependencies=dependencies)
+    layers = build_execution_layers(dag)
 
-    async with stdio_client(DB_PARAMS) as (db_r, db_w), \
-               stdio_client(FILE_PARAMS) as (file_r, file_w):
+    # Optional planner pass: sibling create_user steps become one create_users call
+    if batch:
+        batched_plan = merge_sibling_batches(plan, layers)
+        if len(batched_plan) != len(plan):
+            plan = batched_plan
+            dag = build_execution_dag(plan, dependencies=dependencies)
+            layers = build_execution_layers(dag)
+
+    # Optional planner pass: db writes become run_transaction steps
+    if transactions:
+        grouped_plan = group_transactions(plan, dependencies)
+        if len(grouped_plan) != len(plan):
+            plan = grouped_plan
+            dag = build_execution_dag(plan, dependencies=dependencies)
+            layers = build_execution_layers(dag)
 
-        async with ClientSession(db_r, db_w) as db_session, \
-                   ClientSession(file_r, file_w) as file_session:
+    execution_state: dict[str, any] = {}
+    own_stats = stats is None
+    if own_stats:
+        stats = ToolStats()
 
-            await db_session.initialize()
-            await file_session.initialize()
+    async with borrow_pool(pool, SERVER_PARAMS, max_in_flight) as pool, \
+               recording(stats, own_stats):
+        db_session = await pool.session("db")
+        file_session = await pool.session("file")
+        router = ReplicaRouter(pool)
 
+        if mode == "layered":
             for layer_idx, layer in enumerate(layers):
-                print(f"\n--- Executing Layer {layer_idx}: tasks {layer} ---")
+                event(log, INFO, "layer.start", "\n--- Executing Layer %d: tasks %s ---",
+                      layer_idx, layer, layer=layer_idx, nodes=layer)
                 await execute_layer(
                     layer,
                     plan,
                     db_session,
                     file_session,
-                    execution_state
+                    execution_state,
+                    pool.limiter,
+                    page_size,
+                    stream_pages,
+                    router,
+                    stats,
+                    result_cache,
+                    blob_store
                 )
+        else:
+            waits_for = {step["id"]: [] for step in plan}
+            for src, dst in dag.edges:
+                waits_for[plan[dst]["id"]].append(plan[src]["id"])
+
+            async def plan_steps():
+                for step in plan:
+                    yield step
+
+            await execute_steps_dataflow(
+                plan_steps(),
+                db_session,
+                file_session,
+                execution_state,
+                pool.limiter,
+                page_size,
+                stream_pages,
+                router,
+                depends_on=lambda step: waits_for[step["id"]],
+                stats=stats,
+                result_cache=result_cache,
+                blob_store=blob_store
+            )
 
     # New: execution_state contains output of every step keyed by step id
     return execution_state
+
+
+# ----------------------------------------------------
+# Dataflow Executor (steps may still be arriving)
+# ----------------------------------------------------
+
+async def execute_steps_dataflow(steps, db_session, file_session, execution_state, limiter,
+                                 page_size=None, stream_pages=False, router=None,
+                                 depends_on=from_refs, stats=None, result_cache=None,
+                                 blob_store=None):
+    """
+    Start every step as soon as the steps it depends on have finished.
+
+    `steps` is an async iterable, so steps can be submitted while the plan is
+    still being generated. A step may only reference ids that were already
+    submitted. `depends_on` maps a step to the ids it waits for; the default,
+    top-level $from alone, ignores contract conflicts (write/write,
+    read-after-write), so pass a StreamingDependencies for plans that rely
+    on plan order.
+    """
+    tasks = {}
+
+    async def run_after(deps, step, refs):
+        if deps:
+            await asyncio.gather(*deps)
+        event(log, INFO, "step.start", " ---- Starting step : %s -- after %s -----",
+              step["id"], refs, step=step["id"], tool=step["tool"], after=refs)
+        return await execute_step(step, db_session, file_session, execution_state, limiter,
+                                  page_size, stream_pages, router, stats, result_cache,
+                                  blob_store)
+
+    try:
+        async for step in steps:
+            refs = depends_on(step)
+            unknown = [ref for ref in refs if ref not in tasks]
+            if unknown:
+                raise ValueError(
+                    f"Step '{step['id']}' references unknown or future step(s) {unknown}"
+                )
+
+            task = asyncio.create_task(run_after([tasks[ref] for ref in refs], step, refs))
+            tasks[step["id"]] = task
+            # Batch steps also stand in for the steps merged into them
+            for member in step.get("members", []):
+                tasks[member] = task
+
+        await asyncio.gather(*set(tasks.values()))
+    finally:
+        for task in tasks.values():
+            if not task.done():
+                task.cancel()
+
+
+async def execute_plan_streaming(steps, max_in_flight=None, page_size=None, stream_pages=False,
+                                 pool=None, stats=None, result_cache=None, blob_store=None,
+                                 fold_pages=False, dependencies="dataflow"):
+    """
+    Execute a plan whose steps arrive incrementally (e.g. from a streaming LLM).
+    Server sessions are ready first (warm when `pool` is given) so early steps
+    run while later ones are still being generated.
+    Each step waits for the earlier steps build_execution_dag would link it
+    to ($from and contract conflicts, see StreamingDependencies); steps
+    arrive unbatched. Paging and `dependencies` are those of
+    execute_plan_parallel_safe.
+    """
+    if page_size is not None and blob_store is None and not fold_pages:
+        blob_store = BlobStore()
+    depends_on = StreamingDependencies(dependencies)
+    execution_state: dict[str, any] = {}
+    own_stats = stats is None
+    if own_stats:
+        stats = ToolStats()
+
+    async with borrow_pool(pool, SERVER_PARAMS, max_in_flight) as pool, \
+               recording(stats, own_stats):
+        db_session = await pool.session("db")
+        file_session = await pool.session("file")
+
+        await execute_steps_dataflow(
+            steps,
+            db_session,
+            file_session,
+            execution_state,
+            pool.limiter,
+            page_size,
+            stream_pages,
+            ReplicaRouter(pool),
+            depends_on=depends_on,
+            stats=stats,
+            result_cache=result_cache,
+            blob_store=blob_store
+        )
+
+    return execution_state
@@ -23,33 +23,158 @@ root.setLevel(logging.DEBUG)
 logger = logging.getLogger(__name__)
 logger.debug("DB SERVER STARTED")
 
+import atexit
+import queue
+import re
 import sqlite3
-from mcp.server.fastmcp import FastMCP
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Any
+
+import anyio
+from mcp.server.fastmcp import Context, FastMCP
+
+# Run as a script from servers/: make the repository's helpers importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers import codec
+from helpers.blob_store import BlobStore
 
 mcp = FastMCP("SQLite3 DB Server" , log_level="CRITICAL")    
 mcp.title = "Database MCP Server"
 mcp.version = "0.1.0"
 
+# ----------------- Connection pool -----------------
+# Absolute path to users.db in the same folder as db_server.py
+DB_PATH = os.path.join(os.path.dirname(__file__), "users.db")
+
+POOL_SIZE = 4
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 128
+
+
+class ConnectionPool:
+    """
+    Server-lifetime pool of SQLite connections.
+
+    Connections are opened lazily (up to `size`), switched to WAL so readers
+    never block the writer, and kept open so sqlite3's per-connection
+    statement cache turns the fixed SQL strings below into reused prepared
+    statements. Writers take the lock up front (BEGIN IMMEDIATE) and wait
+    up to BUSY_TIMEOUT_MS for it instead of failing with "database is locked".
+    """
+
+    def __init__(self, path: str, size: int = POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            isolation_level="IMMEDIATE",
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        # Case-insensitive LIKE (the default), matching the NOCASE name index
+        # that name_prefix filters search
+        conn.execute("PRAGMA case_sensitive_like=OFF")
+        logger.debug(f"Opened pooled connection {self._opened}/{self.size} to {self.path}")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            return self._connect()
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+pool = ConnectionPool(DB_PATH)
+atexit.register(pool.close)
+
+blobs = BlobStore()
+
+
+async def run_db(fn, *args):
+    """
+    Run a blocking DB function on a worker thread so concurrent tool calls
+    are not serialized on the server's event loop.
+    """
+    return await anyio.to_thread.run_sync(fn, *args)
+
+
+# ----------------- SQL -----------------
+SQL_INSERT_USER = "INSERT INTO users (name, email) VALUES (?, ?)"
+SQL_SELECT_USER = "SELECT id, name, email FROM users WHERE id = ?"
+SQL_SELECT_USER_ID = "SELECT id FROM users WHERE id = ?"
+SQL_DELETE_USER = "DELETE FROM users WHERE id = ?"
+SQL_LAST_ROWID = "SELECT last_insert_rowid()"
+# One fixed statement for any number of ids: the id list is bound as a JSON array
+SQL_SELECT_USERS_BY_IDS = (
+    "SELECT id, name, email FROM users "
+    "WHERE id IN (SELECT value FROM json_each(?))"
+)
+SQL_SEARCH_USERS = (
+    "SELECT u.id, u.name, u.email FROM users_fts f "
+    "JOIN users u ON u.id = f.rowid "
+    "WHERE users_fts MATCH ? ORDER BY f.rank LIMIT ?"
+)
+SQL_STATE_VERSIONS = (
+    "SELECT key, version FROM state_versions "
+    "WHERE key IN (SELECT value FROM json_each(?))"
+)
+
+# Row functions take an open connection and leave committing to the caller,
+# so a single tool and run_transaction share them
+
+def _insert_user_row(conn, name: str, email: str) -> dict:
+    cursor = conn.execute(SQL_INSERT_USER, (name, email))
+    return {"id": cursor.lastrowid, "name": name, "email": email}
+
+def _create_user(name: str, email: str) -> dict:
+    with pool.connection() as conn:
+        user = _insert_user_row(conn, name, email)
+        conn.commit()
+    return user
+
 @mcp.tool()
-def create_user(name: str, email: str) -> dict:
+async def create_user(name: str, email: str) -> dict[str, Any]:
     """Create a new user and return their info."""
     logger.debug(f"Creating new user with name {name} and email: {email}")
-    # Absolute path to users.db in the same folder as db_server.py
-    db_path = os.path.join(os.path.dirname(__file__), "users.db")
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO users (name, email) VALUES (?, ?)", (name, email))
-    conn.commit()
-    user_id = cursor.lastrowid
-    conn.close()
-    return {"id": user_id, "name": name, "email": email}
+    return await run_db(_create_user, name, email)
 
-@mcp.tool()
-def update_user(id: int, name: str | None = None, email: str | None = None) -> dict:
-    """Update user fields by ID. Return updated user info."""
-    db_path = os.path.join(os.path.dirname(__file__), "users.db")
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+def _update_user_row(conn, id: int, name: str | None = None, email: str | None = None) -> dict:
     updates = []
     params = []
 
@@ -63,66 +188,283 @@ def update_user(id: int, name: str | None = None, email: str | None = None) -> d
         raise ValueError("No fields provided for update")
     params.append(id)
     sql = f"UPDATE users SET {', '.join(updates)} WHERE id = ?"
-    cursor.execute(sql, tuple(params))
-    conn.commit()
-
-    cursor.execute("SELECT id, name, email FROM users WHERE id = ?", (id,))
-    row = cursor.fetchone()
-    conn.close()
+    conn.execute(sql, tuple(params))
+    row = conn.execute(SQL_SELECT_USER, (id,)).fetchone()
     if row is None:
         raise ValueError(f"User {id} not found")
     return {"id": row[0], "name": row[1], "email": row[2]}
 
+def _update_user(id: int, name: str | None, email: str | None) -> dict:
+    with pool.connection() as conn:
+        user = _update_user_row(conn, id, name, email)
+        conn.commit()
+    return user
+
 @mcp.tool()
-def delete_user(id: int) -> dict:
-    """Delete user by ID. Return deleted user ID."""
-    db_path = os.path.join(os.path.dirname(__file__), "users.db")
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM users WHERE id = ?", (id,))
-    row = cursor.fetchone()
+async def update_user(id: int, name: str | None = None, email: str | None = None) -> dict[str, Any]:
+    """Update user fields by ID. Return updated user info."""
+    return await run_db(_update_user, id, name, email)
+
+def _delete_user_row(conn, id: int) -> dict:
+    row = conn.execute(SQL_SELECT_USER_ID, (id,)).fetchone()
     if row is None:
-        conn.close()
         raise ValueError(f"User {id} not found")
-    cursor.execute("DELETE FROM users WHERE id = ?", (id,))
-    conn.commit()
-    conn.close()
+    conn.execute(SQL_DELETE_USER, (id,))
     return {"deleted_id": row[0]}
 
+def _delete_user(id: int) -> dict:
+    with pool.connection() as conn:
+        result = _delete_user_row(conn, id)
+        conn.commit()
+    return result
+
 @mcp.tool()
-def list_users(name_filter: str | None = None, email_filter: str | None = None) -> list[dict]:
-    """Return users optionally filtered by name or email."""
-    db_path = os.path.join(os.path.dirname(__file__), "users.db")
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+async def delete_user(id: int) -> dict[str, Any]:
+    """Delete user by ID. Return deleted user ID."""
+    return await run_db(_delete_user, id)
+
+def _like_prefix(prefix: str) -> str:
+    # LIKE pattern matching `prefix` literally at the start
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+def _list_users(name_filter: str | None, email_filter: str | None,
+                limit: int | None = None, after_id: int | None = None,
+                name_prefix: str | None = None) -> list[dict]:
     sql = "SELECT id, name, email FROM users WHERE 1=1"
     params = []
+    if after_id is not None:
+        sql += " AND id > ?"
+        params.append(after_id)
+    if name_prefix:
+        # No leading wildcard: searched on idx_users_name (NOCASE)
+        sql += " AND name LIKE ? ESCAPE '\\'"
+        params.append(_like_prefix(name_prefix))
     if name_filter:
         sql += " AND name LIKE ?"
         params.append(f"%{name_filter}%")
     if email_filter:
         sql += " AND email LIKE ?"
         params.append(f"%{email_filter}%")
-    cursor.execute(sql, tuple(params))
-    rows = cursor.fetchall()
-    conn.close()
+    # Keyset pagination: pages are ordered by id, the next page starts after the last id
+    sql += " ORDER BY id"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    with pool.connection() as conn:
+        rows = conn.execute(sql, tuple(params)).fetchall()
     return [{"id": r[0], "name": r[1], "email": r[2]} for r in rows]
 
+def _list_users_blob(name_filter: str | None, email_filter: str | None,
+                    limit: int | None, after_id: int | None,
+                    name_prefix: str | None) -> dict:
+    rows = _list_users(name_filter, email_filter, limit, after_id, name_prefix)
+    handle = blobs.put_json(rows)
+    return {"blob": handle, "count": len(rows), "bytes": blobs.size(handle)}
+
 @mcp.tool()
-def get_user_by_id(id: int) -> dict:
-    """Return a user by their ID."""
-    db_path = os.path.join(os.path.dirname(__file__), "users.db")
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, email FROM users WHERE id = ?", (id,))
-    row = cursor.fetchone()
-    conn.close()
+async def list_users(name_filter: str | None = None, email_filter: str | None = None,
+                     limit: int | None = None, after_id: int | None = None,
+                     as_blob: bool = False,
+                     name_prefix: str | None = None) -> list[dict] | dict[str, Any]:
+    """
+    Return users optionally filtered by name or email, ordered by id.
+    name_filter/email_filter match anywhere (full scan); name_prefix matches
+    the start of the name, case-insensitively, using the name index.
+    Use limit/after_id to page: pass the last id of a page as after_id for the next one.
+    With as_blob, the rows are stored in the shared blob store and only
+    {"blob": "blob://<sha256>", "count", "bytes"} is returned.
+    """
+    if as_blob:
+        return await run_db(_list_users_blob, name_filter, email_filter, limit, after_id,
+                            name_prefix)
+    return await run_db(_list_users, name_filter, email_filter, limit, after_id, name_prefix)
+
+@mcp.tool()
+async def stream_users(ctx: Context, page_size: int = 500, name_filter: str | None = None,
+                       email_filter: str | None = None,
+                       name_prefix: str | None = None) -> dict[str, Any]:
+    """
+    Stream users page by page as progress notifications (message = JSON page).
+    Returns the number of users sent and the last id.
+    """
+    if page_size <= 0:
+        raise ValueError("page_size must be positive")
+    sent = 0
+    after_id = None
+    while True:
+        page = await run_db(_list_users, name_filter, email_filter, page_size, after_id,
+                            name_prefix)
+        if not page:
+            break
+        sent += len(page)
+        after_id = page[-1]["id"]
+        await ctx.report_progress(progress=sent, message=codec.dumps(page))
+        if len(page) < page_size:
+            break
+    return {"count": sent, "last_id": after_id}
+
+def _get_user_by_id(id: int) -> dict:
+    with pool.connection() as conn:
+        row = conn.execute(SQL_SELECT_USER, (id,)).fetchone()
     if row is None:
         raise ValueError(f"User {id} not found")
     return {"id": row[0], "name": row[1], "email": row[2]}
 
+@mcp.tool()
+async def get_user_by_id(id: int) -> dict[str, Any]:
+    """Return a user by their ID."""
+    return await run_db(_get_user_by_id, id)
+
+
+# ----------------- Full-text search -----------------
+SEARCH_FIELDS = {"name", "email"}
+
+def build_match_query(query: str, field: str | None = None) -> str:
+    """
+    Turn free text into an FTS5 query: every token must match, as a prefix.
+    "ali exam" -> {name email}: "ali"* AND "exam"*
+    """
+    tokens = re.findall(r"\w+", query)
+    if not tokens:
+        raise ValueError("Search query has no searchable tokens")
+    if field is not None and field not in SEARCH_FIELDS:
+        raise ValueError(f"Unknown search field '{field}', use one of {sorted(SEARCH_FIELDS)}")
+    columns = field or " ".join(sorted(SEARCH_FIELDS))
+    terms = " AND ".join(f'"{t}"*' for t in tokens)
+    return f"{{{columns}}}: ({terms})"
+
+def _search_users(query: str, field: str | None, limit: int) -> list[dict]:
+    match = build_match_query(query, field)
+    try:
+        with pool.connection() as conn:
+            rows = conn.execute(SQL_SEARCH_USERS, (match, limit)).fetchall()
+    except sqlite3.OperationalError as e:
+        if "no such table" in str(e):
+            raise ValueError("Full-text index missing, run helpers/init_db.py") from e
+        raise
+    return [{"id": r[0], "name": r[1], "email": r[2]} for r in rows]
+
+@mcp.tool()
+async def search_users(query: str, field: str | None = None, limit: int = 20) -> list[dict]:
+    """
+    Full-text search over users by name/email words or word prefixes.
+    field restricts the search to "name" or "email". Best matches first.
+    """
+    return await run_db(_search_users, query, field, limit)
+
+
+# ----------------- Batch tools -----------------
+# Each batch runs as a single transaction: one round trip, one commit.
+
+def _create_users(users: list[dict]) -> list[dict]:
+    rows = []
+    for user in users:
+        if "name" not in user or "email" not in user:
+            raise ValueError(f"Each user needs 'name' and 'email': {user}")
+        rows.append((user["name"], user["email"]))
+    if not rows:
+        return []
+    with pool.connection() as conn:
+        conn.executemany(SQL_INSERT_USER, rows)
+        last_id = conn.execute(SQL_LAST_ROWID).fetchone()[0]
+        conn.commit()
+    # AUTOINCREMENT ids are handed out sequentially and the write lock was
+    # held for the whole batch, so the new ids are contiguous.
+    first_id = last_id - len(rows) + 1
+    return [
+        {"id": first_id + i, "name": name, "email": email}
+        for i, (name, email) in enumerate(rows)
+    ]
+
+@mcp.tool()
+async def create_users(users: list[dict]) -> list[dict]:
+    """Create several users in one transaction. Return their info in input order."""
+    logger.debug(f"Creating {len(users)} users in one batch")
+    return await run_db(_create_users, users)
+
+def _select_users_by_ids(conn, ids: list[int]) -> dict:
+    rows = conn.execute(SQL_SELECT_USERS_BY_IDS, (codec.dumps(ids),)).fetchall()
+    found = {r[0]: {"id": r[0], "name": r[1], "email": r[2]} for r in rows}
+    missing = [i for i in ids if i not in found]
+    if missing:
+        raise ValueError(f"Users {missing} not found")
+    return found
+
+def _get_users_by_ids(ids: list[int]) -> list[dict]:
+    with pool.connection() as conn:
+        found = _select_users_by_ids(conn, ids)
+    return [found[i] for i in ids]
+
+@mcp.tool()
+async def get_users_by_ids(ids: list[int]) -> list[dict]:
+    """Return several users by ID, in the order requested."""
+    return await run_db(_get_users_by_ids, ids)
+
+def _delete_users(ids: list[int]) -> list[dict]:
+    with pool.connection() as conn:
+        _select_users_by_ids(conn, ids)
+        conn.executemany(SQL_DELETE_USER, [(i,) for i in ids])
+        conn.commit()
+    return [{"deleted_id": i} for i in ids]
+
+@mcp.tool()
+async def delete_users(ids: list[int]) -> list[dict]:
+    """Delete several users by ID in one transaction. Return the deleted IDs."""
+    return await run_db(_delete_users, ids)
+
+
+# ----------------- Transactions -----------------
+# Single-row write tools run_transaction can group
+TRANSACTION_OPS = {
+    "create_user": _insert_user_row,
+    "update_user": _update_user_row,
+    "delete_user": _delete_user_row,
+}
+
+def _run_transaction(operations: list[dict]) -> list[dict]:
+    for op in operations:
+        if op.get("tool") not in TRANSACTION_OPS:
+            raise ValueError(
+                f"Unsupported operation {op.get('tool')!r}, expected one of {sorted(TRANSACTION_OPS)}"
+            )
+    # Any failure rolls the whole transaction back (ConnectionPool.connection)
+    with pool.connection() as conn:
+        results = [
+            TRANSACTION_OPS[op["tool"]](conn, **op.get("arguments", {}))
+            for op in operations
+        ]
+        conn.commit()
+    return results
+
+@mcp.tool()
+async def run_transaction(operations: list[dict]) -> list[dict]:
+    """
+    Run create_user / update_user / delete_user operations, given as
+    {"tool": ..., "arguments": {...}}, in order in one transaction with a
+    single commit. If one fails, none is applied. Return each operation's result.
+    """
+    logger.debug(f"Running {len(operations)} operations in one transaction")
+    return await run_db(_run_transaction, operations)
+
+
+# ----------------- State versions -----------------
+
+def _state_versions(keys: list[str]) -> dict:
+    with pool.connection() as conn:
+        found = dict(conn.execute(SQL_STATE_VERSIONS, (codec.dumps(keys),)).fetchall())
+    return {key: found.get(key, 0) for key in keys}
+
+@mcp.tool()
+async def state_version(keys: list[str]) -> dict[str, Any]:
+    """
+    Current version of each state key (e.g. "db.users", "db.users:id=3").
+    Versions are bumped by triggers in the transaction that changes the rows;
+    0 means never written. Needs the state_versions table from helpers/init_db.py.
+    """
+    return {"versions": await run_db(_state_versions, keys)}
+
 
 
 if __name__ == "__main__":
     mcp.run(transport="stdio")
-
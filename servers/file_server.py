@@ -1,12 +1,29 @@
+import base64
+from collections import defaultdict
 from pathlib import Path
+from typing import Any
 from mcp.server.fastmcp import FastMCP
-import json
+import os
+import sys
+
+# Run as a script from servers/: make the repository's helpers importable
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from helpers import codec
+from helpers.blob_store import BlobStore, is_handle
+from helpers.contracts import FS_FILE_PREFIX
+from helpers.file_transfer import MAX_CHUNK_SIZE
 
 mcp = FastMCP("File Server")
 mcp.title = "File MCP Server"
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+blobs = BlobStore()
+
+# mtime ticks can be coarser than back-to-back writes: writes made through
+# this server also count, tagged with the process so a restart can't repeat one
+WRITE_COUNTS = defaultdict(int)
+
 # NOTE THE TRAILING SLASH
 @mcp.resource("file://{path}/")
 def read_file(path: str) -> str:
@@ -17,22 +34,101 @@ def read_file(path: str) -> str:
 
     return file_path.read_text(encoding="utf-8")
 
+
+def allowed_path(path: str) -> Path:
+    file_path = (BASE_DIR / path).resolve()
+    if BASE_DIR not in file_path.parents:
+        raise ValueError(f"File not allowed: {path}")
+    return file_path
+
+
+@mcp.resource("file://{path}/range/{offset}/{length}", mime_type="application/octet-stream")
+def read_file_range(path: str, offset: int, length: int) -> bytes:
+    """
+    Bytes [offset, offset + length) of a file: fewer at its end, none past it.
+    Large files are read range by range (helpers.file_transfer).
+    """
+    file_path = allowed_path(path)
+    if not file_path.is_file():
+        raise ValueError(f"File not allowed: {path}")
+    if offset < 0 or not 0 < length <= MAX_CHUNK_SIZE:
+        raise ValueError(f"Range must have offset >= 0 and 0 < length <= {MAX_CHUNK_SIZE}")
+
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
 @mcp.tool()
-def write_file(path: str, content) -> dict:
+def write_file(path: str, content) -> dict[str, Any]:
     """
     Write content to a file under BASE_DIR.
+    content may be a "blob://<sha256>" handle from the shared blob store:
+    its bytes are copied as they are.
     Returns the file path and status.
     """
-    file_path = (BASE_DIR / path).resolve()
-    if BASE_DIR not in file_path.parents:
-        raise ValueError(f"File not allowed: {path}")
+    file_path = allowed_path(path)
+    if is_handle(content):
+        blobs.copy_to(content, file_path)
+        WRITE_COUNTS[file_path] += 1
+        return {"path": path, "status": "ok", "blob": content}
     if not isinstance(content, str):
-        content = json.dumps(content, indent=2) 
-    with open(path, "w") as f:
-        f.write(content)    
-    #file_path.write_text(content, encoding="utf-8")
+        content = codec.dumps(content, indent=True)
+    file_path.write_text(content, encoding="utf-8")
+    WRITE_COUNTS[file_path] += 1
     return {"path": path, "status": "ok"}
 
+@mcp.tool()
+def append_file(path: str, data: str, offset: int, encoding: str = "utf-8") -> dict[str, Any]:
+    """
+    Write one chunk of a file, as it arrives, at `offset`: 0 starts the file
+    over, any other offset must be the file's current size (the size the
+    previous call returned), so a chunk sent twice is refused rather than
+    appended again.
+    data is text, or base64 when encoding is "base64".
+    Returns the file path and its new size.
+    """
+    file_path = allowed_path(path)
+    if encoding == "base64":
+        chunk = base64.b64decode(data, validate=True)
+    elif encoding == "utf-8":
+        chunk = data.encode("utf-8")
+    else:
+        raise ValueError(f"Unknown encoding '{encoding}', expected 'utf-8' or 'base64'")
+    if len(chunk) > MAX_CHUNK_SIZE:
+        raise ValueError(f"Chunk of {len(chunk)} bytes is over {MAX_CHUNK_SIZE}")
+
+    if offset != 0:
+        size = file_path.stat().st_size if file_path.is_file() else 0
+        if size != offset:
+            raise ValueError(f"Offset {offset} is not the current size {size} of {path}")
+
+    with open(file_path, "wb" if offset == 0 else "ab") as f:
+        f.write(chunk)
+        size = f.tell()
+    WRITE_COUNTS[file_path] += 1
+    return {"path": path, "status": "ok", "size": size}
+
+@mcp.tool()
+def state_version(keys: list[str]) -> dict[str, Any]:
+    """
+    Current version of each file state key ("fs.file:<path>"): its mtime and
+    size plus the writes made through this server. Missing files are version "0".
+    """
+    versions = {}
+    for key in keys:
+        if not key.startswith(FS_FILE_PREFIX):
+            raise ValueError(f"Not a file state key: {key}")
+        file_path = (BASE_DIR / key[len(FS_FILE_PREFIX):]).resolve()
+        if BASE_DIR not in file_path.parents:
+            raise ValueError(f"File not allowed: {key}")
+        try:
+            st = file_path.stat()
+        except FileNotFoundError:
+            versions[key] = "0"
+            continue
+        versions[key] = f"{st.st_mtime_ns}:{st.st_size}:{os.getpid()}:{WRITE_COUNTS[file_path]}"
+    return {"versions": versions}
+
 
 if __name__ == "__main__":
     mcp.run(transport="stdio")
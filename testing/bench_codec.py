@@ -0,0 +1,61 @@
+"""
+Benchmark: JSON work of one list_users -> write_file -> read_file plan per
+helpers.codec backend.
+
+Run from the repo root:
+    python -m testing.bench_codec [n_users ...]
+
+Per plan the rows are encoded once as the list result (or stream page),
+decoded by the client, encoded indented by write_file, decoded again after
+read_file and dumped indented for the debug print.
+"""
+import sys
+import time
+
+from helpers import codec
+
+
+def users(n):
+    return [{"id": i, "name": f"User {i}", "email": f"user{i}@example.com"} for i in range(1, n + 1)]
+
+
+def plan_json_work(rows):
+    text = codec.dumps(rows)                   # list_users result / stream page
+    decoded = codec.loads(text)                # client: tool_payload, pagination
+    written = codec.dumps(decoded, indent=True)    # file_server.write_file
+    read_back = codec.loads(written)           # read_file resource
+    codec.dumps(read_back, indent=True)        # debug print of the file content
+
+
+def time_plan(rows, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        plan_json_work(rows)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(sizes):
+    backends = codec.available()
+    selected = codec.backend
+    print(f"{'users':>8} " + " ".join(f"{name + ' ms':>12}" for name in backends)
+          + f" {'best saving':>12}")
+    try:
+        for n in sizes:
+            rows = users(n)
+            repeat = max(3, 200_000 // n)
+            timings = {}
+            for name in backends:
+                codec.use(name)
+                timings[name] = time_plan(rows, repeat)
+            baseline = timings["json"]
+            best = min(timings.values())
+            print(f"{n:>8} " + " ".join(f"{timings[name] * 1000:>12.2f}" for name in backends)
+                  + f" {1 - best / baseline:>11.0%}")
+    finally:
+        codec.use(selected)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000])
@@ -0,0 +1,21 @@
+"""
+Show where plan execution time goes, from the costs the executors learned.
+
+Run from the repo root after a few plans have executed:
+    python -m testing.cost_report [path/to/.tool_stats.json]
+"""
+import sys
+
+from helpers.tool_stats import DEFAULT_STATS_PATH, ToolStats
+
+
+def main(path=DEFAULT_STATS_PATH):
+    stats = ToolStats(path)
+    if not stats.stats:
+        print(f"No tool timings recorded in {path} yet")
+        return
+    print(stats.format_report())
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,119 @@
+"""
+How much parallelism each dependency mode leaves in our plans.
+
+Run from the repo root:
+    python -m testing.parallelism_report [path/to/.plan_cache.db]
+
+Reports, per plan and helpers.create_DAG dependency mode: edges, depth (the
+number of execution layers), the widest layer, steps per layer, and the
+expected speedup over running the plan sequentially, with step durations
+from helpers.tool_stats.
+
+Besides helpers.plans and the cached plans, two versions of one plan show
+what "dataflow" changes: file writes that take their content through $from
+only wait for the steps they name, while the same writes without $from
+still wait for every earlier db step, as in "conservative".
+"""
+import os
+import sys
+
+from helpers.create_DAG import DEPENDENCY_MODES, build_execution_dag
+from helpers.plan_cache import DEFAULT_CACHE_PATH, PlanCache
+from helpers.plans import get_plan
+from helpers.scheduler import critical_path_ranks
+from helpers.tool_stats import ToolStats
+
+
+def _step(step_id, server, tool, arguments, refs=None):
+    step = {"id": step_id, "type": "tool", "server": server, "tool": tool,
+            "arguments": arguments}
+    if refs is not None:
+        step["$from"] = refs
+    return step
+
+
+def file_write_plans():
+    """
+    db writes followed by file writes of their results, once with $from
+    data flow and once with the content inlined.
+    """
+    db_steps = [
+        _step("create_alice", "db", "create_user",
+              {"name": "Alice", "email": "alice@example.com"}, []),
+        _step("create_bob", "db", "create_user",
+              {"name": "Bob", "email": "bob@example.com"}, []),
+        _step("list_all", "db", "list_users", {}, []),
+        _step("rename_third", "db", "update_user", {"user_id": 3, "name": "Carol"}, []),
+        _step("delete_fourth", "db", "delete_user", {"user_id": 4}, []),
+    ]
+    writes = [("save_alice", "alice.json", "create_alice"),
+              ("save_bob", "bob.json", "create_bob"),
+              ("save_users", "users.json", "list_all")]
+    with_from = db_steps + [
+        _step(step_id, "file", "write_file", {"path": path, "content": {}}, ref)
+        for step_id, path, ref in writes
+    ]
+    without_from = db_steps + [
+        _step(step_id, "file", "write_file", {"path": path, "content": "{}"})
+        for step_id, path, _ in writes
+    ]
+    return [("writes, $from", with_from), ("writes, no $from", without_from)]
+
+
+def levels(dag):
+    """
+    Execution layer of every node: 0 for roots, else 1 + the deepest predecessor.
+    """
+    level = [0] * len(dag)
+    for node in dag.nodes:
+        for succ in dag.successors(node):
+            level[succ] = max(level[succ], level[node] + 1)
+    return level
+
+
+def measure(plan, dependencies, stats):
+    dag = build_execution_dag(plan, verbose=False, dependencies=dependencies)
+    level = levels(dag)
+    depth = max(level) + 1 if level else 0
+    widths = [level.count(i) for i in range(depth)]
+
+    costs = [stats.estimate(step.get("tool")) for step in plan]
+    critical_path = max(critical_path_ranks(dag, costs), default=0.0)
+    return {
+        "edges": dag.number_of_edges(),
+        "depth": depth,
+        "width": max(widths, default=0),
+        "per_layer": len(plan) / depth if depth else 0.0,
+        "speedup": sum(costs) / critical_path if critical_path else 1.0,
+    }
+
+
+def our_plans(cache_path):
+    plans = [("helpers.plans", get_plan())] + file_write_plans()
+    if cache_path and os.path.exists(cache_path):
+        cache = PlanCache(cache_path)
+        try:
+            plans.extend((f"cached #{i}", plan) for i, plan in enumerate(cache.plans()))
+        finally:
+            cache.close()
+    return plans
+
+
+def main(cache_path=DEFAULT_CACHE_PATH):
+    stats = ToolStats()
+    print(f"{'plan':<16} {'mode':<13} {'steps':>6} {'edges':>6} {'depth':>6} "
+          f"{'width':>6} {'steps/layer':>12} {'est. speedup':>13}")
+    for name, plan in our_plans(cache_path):
+        for dependencies in DEPENDENCY_MODES:
+            try:
+                row = measure(plan, dependencies, stats)
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"{name:<16} {dependencies:<13} skipped: {e}")
+                continue
+            print(f"{name:<16} {dependencies:<13} {len(plan):>6} {row['edges']:>6} "
+                  f"{row['depth']:>6} {row['width']:>6} {row['per_layer']:>12.2f} "
+                  f"{row['speedup']:>12.2f}x")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
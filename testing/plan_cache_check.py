@@ -0,0 +1,85 @@
+"""
+Check: asking for the same plan twice calls the LLM once, the second call
+being a plan cache hit.
+
+Run from the repo root (no Ollama needed, the LLM is a stub):
+    python -m testing.plan_cache_check
+
+Plans use each agent's own action schema (for agent/mcp_agent.py with a
+read-back resource step), so they must pass that agent's validation to be
+cached.
+"""
+import asyncio
+import json
+import os
+import tempfile
+
+from agent.mcp_agent import ask_llama
+from helpers.plan_cache import PlanCache
+from hybrid.mcp_agent_hybrid_phase1 import ask_llama_plan
+
+PROMPT = "Create a user, list all users, write them to user_list.json, then read it back."
+
+AGENT_PLAN = [
+    {"type": "tool", "server": "db", "tool": "create_user",
+     "arguments": {"name": "Robert", "email": "rob@example.com"}},
+    {"type": "tool", "server": "db", "tool": "list_users", "arguments": {}},
+    {"type": "tool", "server": "file", "tool": "write_file",
+     "arguments": {"path": "user_list.json", "content": "[]"}},
+    {"type": "resource", "server": "file", "uri": "file://user_list.json/"},
+]
+
+# Phase 1 plans: tool calls with named arguments
+PHASE1_PLAN = [
+    {"tool": "create_user", "arguments": {"name": "Alice", "email": "alice@example.com"}},
+    {"tool": "create_user", "arguments": {"name": "Bob", "email": "bon@example.com"}},
+    {"tool": "list_users", "arguments": {}},
+]
+
+
+class StubLLM:
+    """
+    Stands in for AsyncLLMClient: answers every prompt with one plan.
+    """
+
+    def __init__(self, plan, model="stub-model"):
+        self.plan = plan
+        self.model = model
+        self.calls = 0
+
+    def request_options(self, options=None):
+        return {"model": self.model, "options": dict(options or {})}
+
+    async def generate(self, prompt, options=None):
+        self.calls += 1
+        return json.dumps(self.plan)
+
+    def backoff(self, attempt):
+        return 0
+
+
+async def check(name, ask, plan):
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = PlanCache(os.path.join(tmp, "plans.db"))
+        llm = StubLLM(plan)
+        first = await ask(PROMPT, cache=cache, llm=llm)
+        second = await ask(PROMPT, cache=cache, llm=llm)
+        assert first == second == plan, f"{name}: cached plan differs"
+        assert llm.calls == 1, f"{name}: LLM called {llm.calls} times"
+        stats = cache.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 1, f"{name}: {stats}"
+
+        # Another model sharing the cache must not get this plan
+        other = StubLLM(plan, model="other-model")
+        await ask(PROMPT, cache=cache, llm=other)
+        assert other.calls == 1, f"{name}: served another model's cached plan"
+        print(f"{name}: ok {cache.stats()}")
+
+
+async def main():
+    await check("ask_llama", ask_llama, AGENT_PLAN)
+    await check("ask_llama_plan", ask_llama_plan, PHASE1_PLAN)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,5 +1,6 @@
-import requests
+import asyncio
 import json
+from helpers.llm_client import AsyncLLMClient
 prompt = """
 You are an assistant that can call tools via MCP.
 
@@ -72,21 +73,15 @@ You are an assistant that can call tools via MCP.
 5. Write users list to user_list.json
 6. read user_list.json
 """
-response = requests.post(
-  "http://localhost:11434/api/generate",
-  json={
-                     "model": "llama3",  # your local model
-                     "prompt": prompt,
-                     "stream": False,    # simplified for MCP
-                     "options": {
-                                  "temperature": 0.0,
-                                  "num_predict": 512
-                                }
-                   },
-              timeout=1200,
-         )
-response.raise_for_status()
-response_text = response.json()["response"].strip()
-print(response_text)
-plan = json.loads(response.json()["response"])
-print(plan)
\ No newline at end of file
+
+
+async def main():
+    async with AsyncLLMClient() as llm:
+        response_text = (await llm.generate(prompt, {"num_predict": 512})).strip()
+    print(response_text)
+    plan = json.loads(response_text)
+    print(plan)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())